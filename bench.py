@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+from parsel import Selector
+from fetchers import PROFILE_HEADER_XPATH, RESULTS_TABLE_XPATH
+from helpers import clean_string
+from schema import PROFILE_SCHEMA, ProfilePage
+from scraper import extract_program_pairs, match_result_rows, parse_school_page
+
+
+BENCH_RECORD = {"INST_NAME": "Bench University", "CITY": "Bench", "STATE": "NJ"}
+FIRST_ROW_PLACE_XPATH = '//table[@class="resultsTable"]/tbody/tr[1]/td[2]/text()'
+
+
+def load_corpus(corpus_dir):
+    """_This function is used to read the saved pages and sort them into search and profile pages_
+
+    Args:
+        corpus_dir (_str_): _directory with saved .html pages, e.g. from bot.py --save-html_
+
+    Returns:
+        _tuple_: _(search page html list, profile page html list)_
+    """
+    search_pages = []
+    profile_pages = []
+    for dirpath, _, filenames in os.walk(corpus_dir):
+        for filename in sorted(filenames):
+            if not filename.endswith(".html"):
+                continue
+            with open(os.path.join(dirpath, filename), "r", encoding="utf-8") as f:
+                html = f.read()
+            response = Selector(text=html)
+            if response.xpath(RESULTS_TABLE_XPATH):
+                search_pages.append(html)
+            elif response.xpath(PROFILE_HEADER_XPATH):
+                profile_pages.append(html)
+    return search_pages, profile_pages
+
+
+def best_of(func, repeat):
+    # the fastest repeat is the least disturbed by the rest of the machine
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def scan_search_pages(search_pages):
+    # a name that never matches makes the row matching loop scan every row, the
+    # city and state of the first row make every row go through the name scoring
+    for html in search_pages:
+        response = Selector(text=html)
+        place = response.xpath(FIRST_ROW_PLACE_XPATH).getall()
+        city, _, state = "".join(place).strip().partition(",")
+        match_result_rows(
+            response, BENCH_RECORD["INST_NAME"], city.strip(), state.strip()
+        )
+
+
+def parse_profile_pages(profile_pages):
+    for html in profile_pages:
+        parse_school_page(Selector(text=html), BENCH_RECORD)
+
+
+def time_fields(profile_pages, repeat):
+    """_This function is used to time every schema field and the program extraction separately_
+
+    Returns:
+        _dict_: _field name to mean microseconds per page_
+    """
+    totals = {name: 0.0 for name in PROFILE_SCHEMA}
+    totals["<programs>"] = 0.0
+    responses = [Selector(text=html) for html in profile_pages]
+    for _ in range(repeat):
+        for response in responses:
+            page = ProfilePage(response)
+            for name, extractor in PROFILE_SCHEMA.items():
+                start = perf_counter()
+                extractor(page)
+                totals[name] += perf_counter() - start
+            start = perf_counter()
+            extract_program_pairs(response)
+            totals["<programs>"] += perf_counter() - start
+    runs = repeat * len(responses)
+    return {name: total / runs * 1e6 for name, total in totals.items()}
+
+
+def run_benchmark(corpus_dir, repeat=5):
+    """_This function is used to benchmark the parsing hot path over a corpus of saved pages_
+
+    Args:
+        corpus_dir (_str_): _directory with saved .html pages_
+        repeat (int, optional): _times every measurement is repeated_. Defaults to 5.
+
+    Returns:
+        _dict_: _benchmark results_
+    """
+    search_pages, profile_pages = load_corpus(corpus_dir)
+    if not search_pages and not profile_pages:
+        raise SystemExit("No search or profile pages found in {}".format(corpus_dir))
+
+    names = []
+    for html in search_pages:
+        names.extend(
+            Selector(text=html)
+            .xpath('//table[@class="resultsTable"]/tbody/tr/td[2]//text()')
+            .getall()
+        )
+
+    results = {
+        "search_pages": len(search_pages),
+        "profile_pages": len(profile_pages),
+    }
+    if search_pages:
+        elapsed = best_of(lambda: scan_search_pages(search_pages), repeat)
+        results["search_pages_per_sec"] = len(search_pages) / elapsed
+    if profile_pages:
+        elapsed = best_of(lambda: parse_profile_pages(profile_pages), repeat)
+        results["profile_pages_per_sec"] = len(profile_pages) / elapsed
+        results["fields_us"] = time_fields(profile_pages, repeat)
+    if names:
+        elapsed = best_of(lambda: [clean_string(name) for name in names], repeat)
+        results["clean_string_per_sec"] = len(names) / elapsed
+
+    tracemalloc.start()
+    scan_search_pages(search_pages)
+    parse_profile_pages(profile_pages)
+    results["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return results
+
+
+def print_report(results):
+    print("{:<24} {:>12}".format("metric", "value"))
+    for key in (
+        "search_pages",
+        "search_pages_per_sec",
+        "profile_pages",
+        "profile_pages_per_sec",
+        "clean_string_per_sec",
+        "peak_memory_mb",
+    ):
+        if key in results:
+            print("{:<24} {:>12.1f}".format(key, results[key]))
+    if "fields_us" in results:
+        print("------------------------------------------------")
+        print("{:<24} {:>12}".format("field", "us/page"))
+        for name, micros in sorted(
+            results["fields_us"].items(), key=lambda item: -item[1]
+        ):
+            print("{:<24} {:>12.1f}".format(name, micros))
+
+
+# throughput metrics compared against the baseline, higher is better
+THROUGHPUT_KEYS = (
+    "search_pages_per_sec",
+    "profile_pages_per_sec",
+    "clean_string_per_sec",
+)
+
+
+def find_regressions(results, baseline, max_regression):
+    """_This function is used to compare the throughput of a run with a saved baseline_
+
+    Args:
+        results (_dict_): _results of run_benchmark_
+        baseline (_dict_): _results of an earlier run_
+        max_regression (_float_): _allowed slowdown, 0.2 means 20% fewer pages/sec_
+
+    Returns:
+        _list_: _messages for every metric slower than allowed_
+    """
+    regressions = []
+    for key in THROUGHPUT_KEYS:
+        if key in results and key in baseline:
+            floor = baseline[key] * (1 - max_regression)
+            if results[key] < floor:
+                regressions.append(
+                    "{} dropped to {:.1f} (baseline {:.1f}, floor {:.1f})".format(
+                        key, results[key], baseline[key], floor
+                    )
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parsing code over saved NCES pages, no network needed"
+    )
+    parser.add_argument(
+        "corpus", help="directory with saved search and profile .html pages"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="repeats per measurement"
+    )
+    parser.add_argument(
+        "--baseline", help="json file of an earlier run to compare with"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="fail when throughput drops more than this fraction below the baseline",
+    )
+    parser.add_argument("--save-baseline", help="write the results to this json file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.corpus, repeat=args.repeat)
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.max_regression)
+        if regressions:
+            print("------------------------------------------------")
+            for message in regressions:
+                print("REGRESSION: " + message)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
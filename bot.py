@@ -1,488 +1,523 @@
-from time import sleep
-from parsel import Selector
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import pandas as pd
-from selenium.webdriver.common.action_chains import ActionChains
-import os
-from datetime import datetime
-import json
-import us
-from pprint import pprint
-import re
-
-
-# helper function for getting values from selector object
-def parse(response, xpath, get_method="get", comma_join=False, space_join=True):
-    """_This function is used to get values from selector object by using xpath expressions_
-
-    Args:
-        response (_scrapy.Selector_): _A selector object on which we can use xpath expressions_
-        xpath_str (_str_): _xpath expression to be used_
-        get_method (str, optional): _whether to get first element or all elements_. Defaults to "get".
-        comma_join (bool, optional): _if we are getting all elements whether to join on comma or not_. Defaults to False.
-        space_join (bool, optional): _if we are getting all elements whether to join on space or not_. Defaults to False.
-
-    Returns:
-        _str_: _resultant value of using xpath expression on the scrapy.Selector object_
-    """
-    value = ""
-    if get_method == "get":
-        value = response.xpath(xpath).get()
-        value = (value or "").strip()
-    elif get_method == "getall":
-        value = response.xpath(xpath).getall()
-        if value:
-            if comma_join:
-                value = " ".join(
-                    ", ".join([str(x).strip() for x in value]).split()
-                ).strip()
-                value = (value or "").strip()
-            elif space_join:
-                value = " ".join(
-                    " ".join([str(x).strip() for x in value]).split()
-                ).strip()
-                value = (value or "").strip()
-        else:
-            value = ""
-    return value
-
-
-# this function is used to setup the bot
-def bot_setup(headless=False):
-    """_This function is used to setup the bot_
-
-    Args:
-        proxy_switch (_int_): _whether to use proxy or not, 0 means yes, and 1 means no_
-        headless (bool, optional): _whether to run the bot in headless mode or not_. Defaults to False.
-
-    Returns:
-        _selenium.webdriver_: _returns a selenium.webdriver object to be used_
-    """
-
-    # options to be used
-    options = webdriver.ChromeOptions()
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_experimental_option("useAutomationExtension", False)
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("excludeSwitches", ["enable-logging"])
-    # if headless==True, make the bot headless
-    if headless:
-        options.add_argument("--headless=new")
-
-    driver = webdriver.Chrome(
-        service=Service(),
-        options=options,
-    )
-    # setup implicit wait
-    driver.implicitly_wait(3)
-    driver.maximize_window()
-    return driver
-
-
-def send_keys(driver, xpath, keys, wait_time=5):
-    element = WebDriverWait(driver, wait_time).until(
-        EC.presence_of_element_located((By.XPATH, xpath))
-    )
-    element.send_keys(keys)
-
-
-def click_btn(driver, xpath, wait_time=5):
-    btn = WebDriverWait(driver, wait_time).until(
-        EC.presence_of_element_located((By.XPATH, xpath))
-    )
-    ActionChains(driver).move_to_element(btn).perform()
-    sleep(1)
-    ActionChains(driver).click(btn).perform()
-
-
-def wait_for_element(driver, xpath, wait_time=5):
-    WebDriverWait(driver, wait_time).until(
-        EC.presence_of_element_located((By.XPATH, xpath))
-    )
-
-
-def get_state_full_name(abbreviation):
-    try:
-        state = us.states.lookup(abbreviation)
-        return state.name
-    except:
-        return False
-
-
-def get_max_value_plus_one(dictionary):
-    values = dictionary.values()
-    if not values:
-        return 1
-
-    max_value = max(values)
-    return max_value + 1
-
-
-def save_ids_file(major_ids, program_ids, filepath):
-    json_ = {
-        "major_ids": major_ids,
-        "program_ids": program_ids,
-    }
-    with open(filepath, "w") as f:
-        json.dump(json_, f, indent=4)
-
-
-def clean_string(input_string):
-    # Define special characters
-    special_chars = "!@#$%^&*()_-+={}[]|\:;'<>,.?/~`"
-    
-    # Remove special characters
-    cleaned_string = ''.join(char for char in input_string if char.isalnum() or char not in special_chars)
-    
-    # Remove spaces
-    cleaned_string = cleaned_string.replace(' ', '')
-    
-    # Convert to lowercase
-    cleaned_string = cleaned_string.lower()
-    
-    return cleaned_string
-
-
-current_datetime = datetime.now()
-formatted_datetime = current_datetime.strftime("%d-%m-%Y_%I-%M-%p")
-
-
-ids_file_path = "ids.json"
-input_csv_path = "input.csv"
-output_file_path = f"output_{formatted_datetime}.xlsx"
-
-df = pd.read_csv(input_csv_path)
-inp_records = df.to_dict(orient="records")
-
-if os.path.exists(ids_file_path):
-    with open(ids_file_path, "r") as f:
-        ids = json.load(f)
-else:
-    ids = {}
-
-majors_ids = ids.get("major_ids", {})
-program_ids = ids.get("program_ids", {})
-
-driver = bot_setup()
-
-school_data = []
-program_data = []
-
-for inp_idx, inp_rec in enumerate(inp_records): 
-    for _ in range(3):
-        try:
-            print("------------------------------------------------")
-            print("Processing -> {}/{}".format(inp_idx + 1, len(inp_records)))
-            pprint(inp_rec, sort_dicts=False)
-
-            institute_name = inp_rec["INST_NAME"]
-            institute_name_from_input = clean_string(institute_name)
-
-            city = inp_rec["CITY"]
-            city_from_input = clean_string(city)
-
-            state = inp_rec["STATE"]
-
-            complete_state_name = get_state_full_name(state.strip())
-            if not complete_state_name:
-                if state.strip() == "DC":
-                    complete_state_name = "District of Columbia"
-
-            complete_state_name_from_input = clean_string(complete_state_name)
-
-            driver.get(
-                "https://nces.ed.gov/collegenavigator/?s=IL&pg=3&id=144005#enrolmt"
-            )
-
-            wait_for_element(driver, xpath='//input[@value="Type name of school here"]')
-            sleep(1)
-            send_keys(
-                driver,
-                xpath='//input[@value="Type name of school here"]',
-                keys=Keys.CONTROL + "a",
-            )
-            send_keys(
-                driver,
-                xpath='//input[@value="Type name of school here"]',
-                keys=Keys.DELETE,
-            )
-            sleep(0.3)
-            send_keys(
-                driver,
-                xpath='//input[@value="Type name of school here"]',
-                keys=institute_name,
-            )
-            sleep(1)
-            for ch in complete_state_name:
-                send_keys(
-                    driver,
-                    xpath='//select[@id="ctl00_cphCollegeNavBody_ucSearchMain_ucMapMain_lstState"]',
-                    keys=ch,
-                )
-                sleep(0.05)
-            sleep(1)
-            send_keys(
-                driver,
-                xpath='//select[@id="ctl00_cphCollegeNavBody_ucSearchMain_ucMapMain_lstState"]',
-                keys=Keys.ENTER,
-            )
-            sleep(2)
-            try:
-                wait_for_element(driver, xpath='//table[@class="resultsTable"]')
-                response = Selector(text=driver.page_source)
-                no_results = parse(response, xpath='//div[@class="noresults"]')
-                if no_results:
-                    print("Results Table not visible...")
-                    break
-            except:
-                print("Results Table not visible...")
-                break
-
-            sleep(1)
-            university_url_found = False
-            while True:
-                response = Selector(text=driver.page_source)
-
-                university_rows = response.xpath(
-                    '//table[@class="resultsTable"]/tbody/tr'
-                )
-
-                for uni_row in university_rows:
-                    university_name_from_website = parse(
-                        uni_row, "./td[2]/a/strong/text()"
-                    )
-                    university_name_from_website = clean_string(
-                        university_name_from_website
-                    )
-
-                    university_state_from_website_city = parse(
-                        uni_row, "./td[2]/text()", get_method="getall"
-                    )
-
-                    university_state_from_website = (
-                        university_state_from_website_city.split(",")[-1].strip()
-                    )
-                    university_state_from_website = clean_string(
-                        university_state_from_website
-                    )
-                    university_city_from_website = (
-                        university_state_from_website_city.split(",")[0].strip()
-                    )
-                    university_city_from_website = clean_string(
-                        university_city_from_website
-                    )
-                    
-                    university_url = parse(uni_row, "./td[2]/a/@href")
-
-                    if (
-                        institute_name_from_input in university_name_from_website
-                        and complete_state_name_from_input
-                        == university_state_from_website
-                        and city_from_input == university_city_from_website
-                    ):
-                        university_url_found = True
-                        break
-
-                if university_url_found:
-                    break
-
-                is_next_page = parse(response, xpath='//a[text()="Next Page »"]')
-                if is_next_page:
-                    click_btn(driver, xpath='//a[text()="Next Page »"]')
-                    try:
-                        wait_for_element(driver, xpath='//table[@class="resultsTable"]')
-                    except:
-                        break
-                else:
-                    break
-
-            if not university_url_found:
-                print("University URL not found...")
-                break
-
-            university_url = "https://nces.ed.gov/collegenavigator/" + university_url
-            driver.get(university_url)
-            sleep(2)
-            try:
-                wait_for_element(driver, xpath='//span[@class="headerlg"]')
-            except:
-                break
-            sleep(1)
-            response = Selector(text=driver.page_source)
-            school_items = {}
-            school_items["OPEID"] = (
-                parse(
-                    response,
-                    xpath='//span[@class="ipeds"]/text()[contains(., "OPE ID")]',
-                )
-                .split(":")[-1]
-                .strip()
-            )
-            school_items["School_Name"] = institute_name
-            school_items["City"] = city
-            school_items["State"] = state
-            school_items["Program_IDs"] = ""
-            school_items["Total_Enrollment"] = parse(
-                response,
-                xpath='//th[@scope="col" and text()="Total enrollment"]/following-sibling::th[@scope="col"]/text()',
-            )
-            school_items["Student Population"] = parse(
-                response,
-                xpath='//td[@class="srb" and contains(text(), "Student population")]/following-sibling::td[1]/text()',
-            )
-            school_items["Criminal_Offenses_a"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[1]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_b"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[2]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_c"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[3]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_d"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[4]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_e"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[5]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_f"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[6]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_g"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[7]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_h"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[8]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_i"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[9]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_j"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[10]/td[last()]/text()',
-            )
-            school_items["Criminal_Offenses_k"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Criminal Offenses")]/following-sibling::tr[11]/td[last()]/text()',
-            )
-
-            school_items["VAWA_Offenses_a"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "VAWA Offenses")]/following-sibling::tr[1]/td[last()]/text()',
-            )
-            school_items["VAWA_Offenses_b"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "VAWA Offenses")]/following-sibling::tr[2]/td[last()]/text()',
-            )
-            school_items["VAWA_Offenses_c"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "VAWA Offenses")]/following-sibling::tr[3]/td[last()]/text()',
-            )
-
-            school_items["Arrests_a"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Arrests")]/following-sibling::tr[1]/td[last()]/text()',
-            )
-            school_items["Arrests_b"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Arrests")]/following-sibling::tr[2]/td[last()]/text()',
-            )
-            school_items["Arrests_c"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Arrests")]/following-sibling::tr[3]/td[last()]/text()',
-            )
-
-            school_items["Disciplinary_Actions_a"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Disciplinary Actions")]/following-sibling::tr[1]/td[last()]/text()',
-            )
-            school_items["Disciplinary_Actions_b"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Disciplinary Actions")]/following-sibling::tr[2]/td[last()]/text()',
-            )
-            school_items["Disciplinary_Actions_c"] = parse(
-                response,
-                xpath='//div[@id="crime"]//div[@class="tablenames" and text()="On-Campus"]/following-sibling::table[1]/tbody/tr[@class="subrow nb" and contains(., "Disciplinary Actions")]/following-sibling::tr[3]/td[last()]/text()',
-            )
-
-            school_data.append(school_items)
-
-            program_rows = response.xpath(
-                '(//div[@id="programs"]//table[@class="pmtabular"]/tbody/tr[@class="subrow nb"])[1]/following-sibling::tr[@class="level1indent"]'
-            )
-            majors = parse(
-                response,
-                xpath='//div[@id="programs"]//table[@class="pmtabular"]/tbody/tr[@class="subrow nb"]/td/text()',
-                get_method="getall",
-                space_join=False,
-            )
-            majors = [str(x).strip() for x in majors]
-
-            school_program_ids = []
-
-            for program_row in program_rows:
-                programs = {}
-
-                major_name = parse(
-                    program_row,
-                    './preceding-sibling::tr[@class="subrow nb"][1]/td/text()',
-                )
-                if major_name in majors_ids:
-                    major_idx = majors_ids[major_name]
-                else:
-                    major_idx = get_max_value_plus_one(majors_ids)
-                    majors_ids[major_name] = major_idx
-
-                    save_ids_file(majors_ids, program_ids, ids_file_path)
-
-                program_name = parse(program_row, "./td[1]/text()")
-
-                if program_name in program_ids:
-                    program_idx = program_ids[program_name]
-                else:
-                    program_idx = get_max_value_plus_one(program_ids)
-                    program_ids[program_name] = program_idx
-
-                    save_ids_file(majors_ids, program_ids, ids_file_path)
-
-                school_program_ids.append(program_idx)
-
-                programs["OPEID"] = school_items["OPEID"]
-                programs["Major_IDs"] = major_idx
-                programs["Program_IDs"] = program_idx
-                programs["Major"] = major_name
-                programs["Program"] = program_name
-
-                program_data.append(programs)
-
-            school_items["Program_IDs"] = ";".join([str(x) for x in school_program_ids])
-
-            school_data_df = pd.DataFrame(school_data)
-            program_data_df = pd.DataFrame(program_data)
-
-            with pd.ExcelWriter(output_file_path, engine="xlsxwriter") as writer:
-                # Write each DataFrame to a separate sheet
-                school_data_df.to_excel(writer, sheet_name="School", index=False)
-                program_data_df.to_excel(writer, sheet_name="Program", index=False)
-
-            break
-        except:
-            continue
-
-
-driver.close()
-driver.quit()
+import argparse
+import os
+from datetime import datetime
+from functools import partial
+from pprint import pprint
+from time import sleep
+from cache import PageCache
+from delta import PreviousRun, write_diff
+from fetchers import BASE_URL, ENGINES, RateLimiter, get_fetcher, webdriver
+from helpers import backoff_delay
+from index import InstitutionIndex
+from inputs import INPUT_FORMATS, InputStream
+from journal import FAILED, NOT_FOUND, SUCCESS, UNCHANGED, RunJournal
+from metrics import run_metrics
+from output import FORMATS, JsonlSink, export, pyarrow
+from pool import FetcherPool, imap_ordered
+from registry import IdRegistry
+from schema import SECTIONS, build_schema
+from scraper import scrape_school, assign_program_ids
+from workqueue import WorkQueue, open_queue, run_worker, serve_queue
+
+
+def parse_args():
+    current_datetime = datetime.now()
+    formatted_datetime = current_datetime.strftime("%d-%m-%Y_%I-%M-%p")
+
+    parser = argparse.ArgumentParser(
+        description="Scrape school and program data from NCES College Navigator"
+    )
+    parser.add_argument(
+        "--input",
+        default="input.csv",
+        help="input csv or json lines file, - reads it from stdin",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=INPUT_FORMATS,
+        default="auto",
+        help="format of --input, auto picks it from the file extension (csv for stdin)",
+    )
+    parser.add_argument("--ids", default="ids.json", help="major/program ids file")
+    parser.add_argument(
+        "--ids-flush-interval",
+        type=float,
+        default=0,
+        help="min seconds between two rewrites of the ids file, new ids are appended to <ids>.log in between",
+    )
+    parser.add_argument(
+        "--merge-batch",
+        type=int,
+        default=20,
+        help="scraped schools given ids and written together",
+    )
+    parser.add_argument(
+        "--output",
+        default=f"output_{formatted_datetime}.xlsx",
+        help="output xlsx file, built once at the end of the run",
+    )
+    parser.add_argument(
+        "--store",
+        default=f"output_{formatted_datetime}",
+        help="directory the scraped rows are streamed to as json lines",
+    )
+    parser.add_argument(
+        "--no-excel",
+        action="store_true",
+        help="only write the json lines store, build the xlsx later with output.py",
+    )
+    parser.add_argument(
+        "--format",
+        action="append",
+        choices=FORMATS,
+        help="export format, can be repeated; parquet and arrow tables are written to --store (needs pyarrow). Defaults to xlsx",
+    )
+    parser.add_argument(
+        "--section",
+        action="append",
+        default=[],
+        choices=sorted(SECTIONS),
+        help="extra profile fields to extract from the same page load, can be repeated",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default="http",
+        help="fetch backend, selenium drives a real chrome browser",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=BASE_URL,
+        help="College Navigator root url, e.g. a local stub server for offline runs",
+    )
+    parser.add_argument(
+        "--headless",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="run chrome headless, --no-headless shows the window (selenium only)",
+    )
+    parser.add_argument(
+        "--driver-max-pages",
+        type=int,
+        default=200,
+        help="pages a browser loads before it is replaced, 0 keeps it (selenium only)",
+    )
+    parser.add_argument(
+        "--load-resources",
+        action="store_true",
+        help="let chrome load images, stylesheets, fonts and analytics (selenium only)",
+    )
+    parser.add_argument(
+        "--save-html",
+        metavar="DIR",
+        help="also save every fetched page to DIR, e.g. as a corpus for bench.py",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of schools scraped at the same time, each with its own session/driver",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=5,
+        help="max requests per second to nces.ed.gov across all workers, 0 for no limit",
+    )
+    parser.add_argument(
+        "--cache",
+        default="cache",
+        help="directory of the page cache (http engine only)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="always download every page"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=30,
+        help="days a cached page is used before asking the server if it changed",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=500,
+        help="size of the cache above which the least recently used pages are deleted",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="replay pages from the cache only, never go to the network",
+    )
+    parser.add_argument(
+        "--index",
+        default="institutions.json",
+        help="local institution index used to open profiles without searching",
+    )
+    parser.add_argument(
+        "--no-index", action="store_true", help="always search for every school"
+    )
+    parser.add_argument(
+        "--json-log",
+        metavar="FILE",
+        help="append one json line per school with its status, retries, pages and stage times",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="FILE",
+        help="keep prometheus text metrics in FILE, rewritten every 10 seconds and at the end",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve prometheus metrics on http://0.0.0.0:PORT/metrics while running",
+    )
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument(
+        "--coordinator",
+        metavar="HOST:PORT",
+        help="queue the input rows and serve them to --worker processes, e.g. 0.0.0.0:8600",
+    )
+    role.add_argument(
+        "--worker",
+        metavar="QUEUE",
+        help="scrape rows leased from a coordinator url or a queue.sqlite path",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=300,
+        help="time a worker has to finish a leased row before it is queued again",
+    )
+    parser.add_argument(
+        "--delta",
+        metavar="PREVIOUS_STORE",
+        help="store of an earlier run: schools whose profile did not change are copied from it, and diff.jsonl lists the changes",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the run in --store, only scrape pending and failed rows",
+    )
+    mode.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="only scrape the rows that failed in the run in --store",
+    )
+    args = parser.parse_args()
+    if args.offline and (args.no_cache or args.engine != "http"):
+        parser.error("--offline replays the cache of the http engine")
+    if args.engine == "selenium" and webdriver is None:
+        parser.error("the selenium engine needs selenium installed")
+    if (args.resume or args.retry_failed) and not os.path.isdir(args.store):
+        parser.error("--resume/--retry-failed need --store of an existing run")
+    if args.delta and not os.path.isdir(args.delta):
+        parser.error("--delta needs the store of an earlier run")
+    if args.delta and os.path.abspath(args.delta) == os.path.abspath(args.store):
+        parser.error("--delta has to be another store than --store")
+    args.format = args.format or ["xlsx"]
+    if args.no_excel:
+        args.format = [fmt for fmt in args.format if fmt != "xlsx"]
+    if pyarrow is None and set(args.format) - {"xlsx"}:
+        parser.error("the parquet and arrow formats need pyarrow installed")
+    return args
+
+
+MAX_ATTEMPTS = 3
+
+
+def process_record(fetcher_pool, index, schema, total, indexed_rec):
+    """_This function is used to scrape one input record, retrying with exponential backoff_
+
+    Args:
+        fetcher_pool (_FetcherPool_): _pool handing out the fetcher of the current worker_
+        index (_InstitutionIndex_): _local institution index, or None_
+        schema (_dict_): _fields to extract from the profile pages_
+        total (_int_): _number of input records, only used for the progress print, None if unknown_
+        indexed_rec (_tuple_): _(index, input record)_
+
+    Returns:
+        _tuple_: _(status, result of scrape_school), result is None unless status is SUCCESS_
+    """
+    inp_idx, inp_rec = indexed_rec
+    run_metrics.begin_record(inp_idx)
+    if not inp_rec["STATE_NAME"]:
+        # no search can find a school of an unknown state, retrying would not help
+        print("Unknown state {!r} -> {}".format(inp_rec["STATE"], inp_rec["INST_NAME"]))
+        run_metrics.end_record(NOT_FOUND, 1)
+        return NOT_FOUND, None
+    status, result = FAILED, None
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            print("------------------------------------------------")
+            print("Processing -> {}/{}".format(inp_idx + 1, total or "?"))
+            pprint(inp_rec, sort_dicts=False)
+
+            result = scrape_school(
+                fetcher_pool.get(), inp_rec, index=index, schema=schema
+            )
+            if result is None:
+                status = NOT_FOUND
+            elif result[0] is None:
+                status = UNCHANGED
+            else:
+                status = SUCCESS
+            break
+        except Exception as e:
+            print("Attempt {} failed -> {!r}".format(attempt + 1, e))
+            if attempt + 1 < MAX_ATTEMPTS:
+                with run_metrics.phase("backoff"):
+                    sleep(backoff_delay(attempt))
+    run_metrics.end_record(status, attempt + 1)
+    return status, result
+
+
+def build_fetcher_pool(args):
+    """_This function is used to create the per-worker fetchers and their shared rate limiter and cache_
+
+    Returns:
+        _tuple_: _(FetcherPool, PageCache or None)_
+    """
+    rate_limiter = RateLimiter(args.rate)
+    cache = None
+    if not args.no_cache:
+        cache = PageCache(
+            args.cache,
+            ttl=args.cache_ttl * 24 * 3600,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024),
+            offline=args.offline,
+        )
+    fetcher_pool = FetcherPool(
+        partial(
+            get_fetcher,
+            args.engine,
+            base_url=args.base_url,
+            headless=args.headless,
+            max_pages=args.driver_max_pages,
+            block_resources=not args.load_resources,
+            rate_limiter=rate_limiter,
+            save_html=args.save_html,
+            cache=cache,
+        )
+    )
+    return fetcher_pool, cache
+
+
+def merge_results(batch, registry, sink, journal, previous=None):
+    """_This function is used to give ids to a batch of scraped schools and write their rows, in input order_
+
+    Args:
+        batch (_list_): _(input record, status, result) tuples in input order_
+        registry (_IdRegistry_): _major and program ids_
+        sink (_JsonlSink_): _store of the school and program rows_
+        journal (_RunJournal_): _status of every input row_
+        previous (_PreviousRun_, optional): _earlier run the rows of unchanged schools are copied from_. Defaults to None.
+    """
+    found = [result[:2] for _, status, result in batch if status == SUCCESS]
+    with run_metrics.phase("ids"):
+        program_items = iter(assign_program_ids(found, registry))
+    with run_metrics.phase("write"):
+        # new ids are saved before the rows that use them
+        registry.flush()
+        for inp_rec, status, result in batch:
+            opeid, page_hash = "", ""
+            if status == SUCCESS:
+                sink.write(result[0], next(program_items))
+                opeid, page_hash = result[0]["OPEID"], result[2]
+            elif status == UNCHANGED:
+                school_items, previous_programs = previous.rows(inp_rec["KEY"])
+                sink.write(school_items, previous_programs)
+                opeid, page_hash = school_items["OPEID"], result[2]
+            journal.record(inp_rec, status, opeid=opeid, content_hash=page_hash)
+
+
+def batches(items, size):
+    """_Groups items in lists of up to size items_"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_local(args, pending_records, registry, sink, journal, previous=None):
+    fetcher_pool, cache = build_fetcher_pool(args)
+    index = None if args.no_index else InstitutionIndex(args.index)
+
+    results = imap_ordered(
+        partial(
+            process_record, fetcher_pool, index, build_schema(args.section), None
+        ),
+        pending_records,
+        workers=args.workers,
+    )
+    # results come back in input order, so ids and rows are the same for any worker count
+    for batch in batches(results, args.merge_batch):
+        merge_results(
+            [(inp_rec, status, result) for (_, inp_rec), (status, result) in batch],
+            registry,
+            sink,
+            journal,
+            previous,
+        )
+
+    fetcher_pool.close()
+    if index:
+        index.save()
+    if cache:
+        cache.close()
+
+
+def run_coordinator(args, pending_records, registry, sink, journal, previous=None):
+    """_This function is used to serve the input rows to workers and merge their results in input order_
+
+    Only the coordinator hands out major/program ids and writes rows, so ids stay
+    globally consistent and the output does not depend on which worker did a row.
+    """
+    host, port = args.coordinator.rsplit(":", 1)
+    queue = WorkQueue(
+        os.path.join(args.store, "queue.sqlite"), lease_seconds=args.lease_seconds
+    )
+    for batch in batches(pending_records, 1000):
+        queue.enqueue(batch)
+    server = serve_queue(queue, host, int(port))
+    print("Serving {} rows on {}".format(queue.unmerged(), args.coordinator))
+
+    while queue.unmerged():
+        for batch in batches(queue.ready_results(), args.merge_batch):
+            merge_results(
+                [(inp_rec, status, result) for _, inp_rec, (status, result) in batch],
+                registry,
+                sink,
+                journal,
+                previous,
+            )
+            for pos, _, _ in batch:
+                queue.mark_merged(pos)
+        print("Queue -> {}".format(queue.counts()))
+        sleep(2)
+
+    server.shutdown()
+    queue.close()
+
+
+def run_worker_mode(args):
+    queue = open_queue(args.worker, lease_seconds=args.lease_seconds)
+    fetcher_pool, cache = build_fetcher_pool(args)
+    index = None if args.no_index else InstitutionIndex(args.index)
+
+    run_worker(
+        queue,
+        partial(
+            process_record, fetcher_pool, index, build_schema(args.section), None
+        ),
+        partial(imap_ordered, workers=args.workers),
+        batch_size=max(args.workers, 1) * 2,
+    )
+
+    fetcher_pool.close()
+    if index:
+        index.save()
+    if cache:
+        cache.close()
+    queue.close()
+
+
+def start_metrics(args):
+    if args.json_log:
+        run_metrics.open_json_log(args.json_log)
+    if args.metrics_file:
+        run_metrics.export_every(args.metrics_file)
+    if args.metrics_port:
+        run_metrics.serve(args.metrics_port)
+
+
+def finish_metrics(args):
+    print("------------------------------------------------")
+    print(run_metrics.report())
+    if args.metrics_file:
+        run_metrics.write_prometheus(args.metrics_file)
+    run_metrics.close()
+
+
+def main():
+    args = parse_args()
+    start_metrics(args)
+
+    if args.worker:
+        run_worker_mode(args)
+        finish_metrics(args)
+        return
+
+    output_file_path = args.output
+
+    inputs = InputStream(args.input, input_format=args.input_format)
+
+    registry = IdRegistry(args.ids, flush_interval=args.ids_flush_interval)
+    sink = JsonlSink(args.store)
+    journal = RunJournal(args.store)
+    previous = PreviousRun(args.delta) if args.delta else None
+
+    if args.resume:
+        mode = "resume"
+    elif args.retry_failed:
+        mode = "retry-failed"
+    else:
+        mode = "all"
+    # rows are read and filtered lazily, as the workers have room for them
+    pending_records = (
+        (inp_idx, previous.annotate(inp_rec) if previous else inp_rec)
+        for inp_idx, inp_rec in inputs
+        if journal.should_process(inp_rec, mode)
+    )
+
+    if args.coordinator:
+        run_coordinator(args, pending_records, registry, sink, journal, previous)
+    else:
+        run_local(args, pending_records, registry, sink, journal, previous)
+    print(
+        "{} input rows, {} duplicates skipped ({} mode)".format(
+            inputs.rows, inputs.duplicates, mode
+        )
+    )
+
+    registry.flush(force=True)
+    sink.close()
+    journal.close()
+
+    if previous:
+        with run_metrics.phase("diff"):
+            failed_keys = [
+                key
+                for key, entry in journal.entries.items()
+                if entry["status"] == FAILED
+            ]
+            counts = write_diff(previous, args.store, failed_keys)
+        previous.close()
+        print(
+            "Changes since {} -> {}".format(
+                args.delta,
+                ", ".join(
+                    "{} {} {}".format(table, change, count)
+                    for (table, change), count in sorted(counts.items())
+                )
+                or "none",
+            )
+        )
+
+    for output_format in dict.fromkeys(args.format):
+        with run_metrics.phase(output_format):
+            if output_format == "xlsx":
+                export(args.store, output_file_path)
+            else:
+                export(args.store, args.store, output_format)
+
+    finish_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+from threading import Lock
+from time import time
+import requests
+
+
+class CacheMiss(Exception):
+    """_Raised in offline mode when a page is not in the cache_"""
+
+
+def cache_key(url, params=None):
+    """_This function is used to get the canonical url of a request, used as cache key_"""
+    if params:
+        params = sorted(params.items())
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+class PageCache:
+    """_On-disk cache of fetched pages with a ttl, conditional revalidation and LRU eviction_
+
+    Pages are stored once per content hash as <sha256>.html files, an sqlite index
+    maps every request url to its page, its validators and its last use.
+
+    Args:
+        cache_dir (_str_): _directory of the cache, created if missing_
+        ttl (float, optional): _seconds a page is used without asking the server again_. Defaults to 30 days.
+        max_bytes (int, optional): _size of all pages above which the least recently used are evicted_. Defaults to 500 MB.
+        offline (bool, optional): _replay from the cache only, stale pages are used and misses raise CacheMiss_. Defaults to False.
+    """
+
+    def __init__(
+        self, cache_dir, ttl=30 * 24 * 3600, max_bytes=500 * 1024 * 1024, offline=False
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = Lock()
+        self.db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"), check_same_thread=False
+        )
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )"""
+        )
+        self.db.commit()
+
+    def blob_path(self, digest):
+        return os.path.join(self.cache_dir, digest + ".html")
+
+    def lookup(self, url):
+        """_Returns the cached entry of url as a dict with html and fresh keys, or None_"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, fetched_at, etag, last_modified FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        digest, fetched_at, etag, last_modified = row
+        try:
+            with open(self.blob_path(digest), "r", encoding="utf-8") as f:
+                html = f.read()
+        except FileNotFoundError:
+            return None
+        self.touch(url)
+        return {
+            "html": html,
+            "fresh": time() - fetched_at < self.ttl,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+
+    def touch(self, url, revalidated=False):
+        """_Marks url as used now, and as fetched now when the server confirmed it did not change_"""
+        now = time()
+        with self.lock:
+            if revalidated:
+                self.db.execute(
+                    "UPDATE pages SET used_at = ?, fetched_at = ? WHERE url = ?",
+                    (now, now, url),
+                )
+            else:
+                self.db.execute(
+                    "UPDATE pages SET used_at = ? WHERE url = ?", (now, url)
+                )
+            self.db.commit()
+
+    def put(self, url, html, etag=None, last_modified=None):
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, len(data), now, now, etag, last_modified),
+            )
+            self.db.commit()
+        self.evict()
+
+    def evict(self):
+        """_Deletes the least recently used pages until the cache fits in max_bytes_
+
+        Pages with the same html share one blob, so every blob is counted once and
+        only frees its size when the last page using it is deleted.
+        """
+        with self.lock:
+            total = self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM"
+                " (SELECT MAX(size) AS size FROM pages GROUP BY digest)"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.db.execute(
+                "SELECT url, digest, size FROM pages ORDER BY used_at"
+            ).fetchall()
+            for url, digest, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                still_used = self.db.execute(
+                    "SELECT 1 FROM pages WHERE digest = ? LIMIT 1", (digest,)
+                ).fetchone()
+                if not still_used:
+                    total -= size
+                    try:
+                        os.remove(self.blob_path(digest))
+                    except FileNotFoundError:
+                        pass
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
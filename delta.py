@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from lxml import etree
+from journal import JOURNAL_FILE, record_key
+from output import PROGRAMS_FILE, SCHOOLS_FILE, read_jsonl
+
+
+DIFF_FILE = "diff.jsonl"
+
+# parts of a profile page the school fields and programs are read from
+HASHED_PARTS = etree.XPath(
+    '//span[@class="ipeds"]'
+    ' | //th[@scope="col" and text()="Total enrollment"]/ancestor::table[1]'
+    ' | //td[@class="srb"]/ancestor::tr[1]'
+    ' | //div[@id="crime"] | //div[@id="programs"]'
+    ' | //div[@id="expenses"] | //div[@id="admsns"] | //div[@id="retgrad"]'
+)
+# school columns that come from the input file, not from the profile page
+INPUT_COLUMNS = ("School_Name", "City", "State")
+
+
+def content_hash(response, schema):
+    """_This function is used to hash the relevant sections of a profile page_
+
+    The names of the schema fields are part of the hash, so a run extracting
+    other fields never counts a page as unchanged.
+
+    Args:
+        response (_parsel.Selector_): _selector of the school profile page_
+        schema (_dict_): _fields extracted from the page_
+
+    Returns:
+        _str_: _sha256 hex digest_
+    """
+    digest = hashlib.sha256()
+    digest.update("\n".join(schema).encode("utf-8"))
+    for element in HASHED_PARTS(response.root):
+        digest.update(etree.tostring(element, encoding="utf-8", with_tail=False))
+    return digest.hexdigest()
+
+
+def school_key(school_items):
+    # the journal KEY of the input row a school row was written for
+    return record_key(
+        {
+            "INST_NAME": school_items["School_Name"],
+            "CITY": school_items["City"],
+            "STATE": school_items["State"],
+        }
+    )
+
+
+def program_ids(school_items):
+    return [int(x) for x in str(school_items.get("Program_IDs") or "").split(";") if x]
+
+
+def json_lines(filepath):
+    """_Yields (start, end, row) of every row of a json lines file, with byte offsets_"""
+    if not os.path.exists(filepath):
+        return
+    pos = 0
+    with open(filepath, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield pos, pos + len(line), json.loads(line)
+            pos += len(line)
+
+
+class StoreReader:
+    """_Random access to the school and program rows of a store, by journal KEY_
+
+    JsonlSink writes the program rows of a school just before the school row, and
+    the Program_IDs of the school list them in order, so every school row is paired
+    with the block of program lines that matches its ids. Program lines without a
+    school row (a crash between the two writes) are skipped. Only byte offsets are
+    kept in memory.
+
+    Args:
+        store_dir (_str_): _directory holding schools.jsonl and programs.jsonl_
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        schools_path = os.path.join(store_dir, SCHOOLS_FILE)
+        programs_path = os.path.join(store_dir, PROGRAMS_FILE)
+
+        programs = [
+            (start, end, (row["OPEID"], row["Program_IDs"]))
+            for start, end, row in json_lines(programs_path)
+        ]
+        # key -> (school span, program span), in the order of the school rows
+        self.spans = {}
+        cursor = 0
+        for start, end, school_items in json_lines(schools_path):
+            ids = program_ids(school_items)
+            expected = [(school_items["OPEID"], program_idx) for program_idx in ids]
+            block = cursor
+            while block + len(ids) <= len(programs) and [
+                program[2] for program in programs[block : block + len(ids)]
+            ] != expected:
+                block += 1
+            if block + len(ids) > len(programs):
+                # the program lines of this school are missing, it can not be reused
+                continue
+            if ids:
+                program_span = (programs[block][0], programs[block + len(ids) - 1][1])
+            else:
+                program_span = (0, 0)
+            cursor = block + len(ids)
+            self.spans.setdefault(school_key(school_items), ((start, end), program_span))
+
+        self.schools = open(schools_path, "rb") if self.spans else None
+        self.programs = (
+            open(programs_path, "rb") if os.path.exists(programs_path) else None
+        )
+
+    @staticmethod
+    def read_span(f, span):
+        start, end = span
+        if end <= start:
+            return []
+        f.seek(start)
+        return [
+            json.loads(line) for line in f.read(end - start).splitlines() if line.strip()
+        ]
+
+    def rows(self, key):
+        """_Reads the school row and program rows of an input key_
+
+        Returns:
+            _tuple_: _(school_items, program_items)_
+        """
+        school_span, program_span = self.spans[key]
+        school_items = self.read_span(self.schools, school_span)[0]
+        return school_items, self.read_span(self.programs, program_span)
+
+    def close(self):
+        for f in (self.schools, self.programs):
+            if f:
+                f.close()
+
+
+class PreviousRun(StoreReader):
+    """_Store of an earlier run, used by delta mode to skip schools whose profile did not change_
+
+    Only the content hashes of its journal and the byte offsets of its rows are
+    kept in memory, the rows of an unchanged school are read from disk when they
+    are copied into the new store.
+
+    Args:
+        store_dir (_str_): _directory of the earlier run_
+    """
+
+    def __init__(self, store_dir):
+        super().__init__(store_dir)
+        self.entries = {}
+        for entry in read_jsonl(os.path.join(store_dir, JOURNAL_FILE)):
+            self.entries[entry["key"]] = entry
+
+    def content_hash(self, key):
+        """_Returns the profile hash of an input key, or None if its rows can not be reused_"""
+        entry = self.entries.get(key)
+        if not entry or key not in self.spans:
+            return None
+        return entry.get("hash") or None
+
+    def annotate(self, inp_rec):
+        """_Adds PREVIOUS_HASH to a normalized input record, it travels with the record to the workers_"""
+        previous_hash = self.content_hash(inp_rec["KEY"])
+        if previous_hash:
+            inp_rec["PREVIOUS_HASH"] = previous_hash
+        return inp_rec
+
+
+def write_diff(previous, store_dir, failed_keys=()):
+    """_This function is used to write the new, changed and removed schools and programs of a delta run_
+
+    Schools are matched on their input KEY, and the program rows of a school are
+    compared as multisets, so schools sharing an OPEID and repeated rows are kept
+    apart. Schools that failed in this run are not reported as removed.
+
+    Args:
+        previous (_PreviousRun_): _the earlier run_
+        store_dir (_str_): _directory of this run, diff.jsonl is written to it_
+        failed_keys (_iterable_, optional): _input keys that failed in this run_. Defaults to ().
+
+    Returns:
+        _dict_: _number of rows of every (table, change)_
+    """
+    failed_keys = set(failed_keys)
+    current = StoreReader(store_dir)
+
+    counts = {}
+    with open(os.path.join(store_dir, DIFF_FILE), "w", encoding="utf-8") as f:
+
+        def emit(table, change, key, row, fields=None):
+            event = {"table": table, "change": change, "key": key, "OPEID": row["OPEID"]}
+            if fields is not None:
+                event["fields"] = fields
+            else:
+                event["row"] = row
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            counts[(table, change)] = counts.get((table, change), 0) + 1
+
+        def emit_programs(key, program_items, other_items, change):
+            # rows of program_items that other_items does not have, counting repeats
+            remaining = Counter(json.dumps(row, sort_keys=True) for row in other_items)
+            for row in program_items:
+                row_json = json.dumps(row, sort_keys=True)
+                if remaining[row_json]:
+                    remaining[row_json] -= 1
+                else:
+                    emit("Program", change, key, row)
+
+        for key in current.spans:
+            school_items, program_items = current.rows(key)
+            if key not in previous.spans:
+                emit("School", "new", key, school_items)
+                emit_programs(key, program_items, [], "new")
+                continue
+            old_school_items, old_program_items = previous.rows(key)
+            fields = {
+                column: [old_school_items.get(column), value]
+                for column, value in school_items.items()
+                if column not in INPUT_COLUMNS and old_school_items.get(column) != value
+            }
+            if fields:
+                emit("School", "changed", key, school_items, fields)
+            emit_programs(key, program_items, old_program_items, "new")
+            emit_programs(key, old_program_items, program_items, "removed")
+
+        for key in previous.spans:
+            if key not in current.spans and key not in failed_keys:
+                old_school_items, old_program_items = previous.rows(key)
+                emit("School", "removed", key, old_school_items)
+                emit_programs(key, old_program_items, [], "removed")
+    current.close()
+    return counts
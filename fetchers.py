@@ -0,0 +1,483 @@
+import hashlib
+import os
+from threading import Lock
+from time import sleep, monotonic
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from cache import CacheMiss, cache_key
+from metrics import run_metrics
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+except ImportError:
+    # selenium is only needed for the browser engine
+    webdriver = None
+
+    class WebDriverException(Exception):
+        """_Stands in for selenium's exception so the except clauses still work without it_"""
+
+    class TimeoutException(WebDriverException):
+        pass
+
+
+BASE_URL = "https://nces.ed.gov/collegenavigator/"
+
+SEARCH_INPUT_XPATH = '//input[@value="Type name of school here"]'
+STATE_SELECT_XPATH = (
+    '//select[@id="ctl00_cphCollegeNavBody_ucSearchMain_ucMapMain_lstState"]'
+)
+RESULTS_TABLE_XPATH = '//table[@class="resultsTable"]'
+NO_RESULTS_XPATH = '//div[@class="noresults"]'
+NEXT_PAGE_XPATH = '//a[text()="Next Page »"]'
+PROFILE_HEADER_XPATH = '//span[@class="headerlg"]'
+
+# fixed sleeps the old selenium flow spent on every step, used to report the time saved
+LEGACY_SLEEPS = {
+    "search": 6.3,
+    "search_state_char": 0.05,
+    "next_page": 1.0,
+    "profile": 3.0,
+}
+
+# requests the browser engine never needs: images, stylesheets, fonts and analytics
+BLOCKED_URL_PATTERNS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.svg",
+    "*.ico",
+    "*.webp",
+    "*.css",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*/gtag/*",
+    "*siteimprove*",
+]
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+# this function is used to setup the bot
+def bot_setup(headless=True, block_resources=True, page_load_timeout=30):
+    """_This function is used to setup the bot_
+
+    Args:
+        headless (bool, optional): _whether to run the bot in headless mode or not_. Defaults to True.
+        block_resources (bool, optional): _whether to block images, stylesheets, fonts and analytics_. Defaults to True.
+        page_load_timeout (int, optional): _seconds before a hung page load raises_. Defaults to 30.
+
+    Returns:
+        _selenium.webdriver_: _returns a selenium.webdriver object to be used_
+    """
+    if webdriver is None:
+        raise RuntimeError("selenium is not installed, use the http engine instead")
+
+    # options to be used
+    options = webdriver.ChromeOptions()
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--window-size=1920,1080")
+    options.add_experimental_option("useAutomationExtension", False)
+    options.add_experimental_option(
+        "excludeSwitches", ["enable-automation", "enable-logging"]
+    )
+    # hand the page over once the DOM is parsed, the waits below check for the elements
+    options.page_load_strategy = "eager"
+    # if headless==True, make the bot headless
+    if headless:
+        options.add_argument("--headless=new")
+    if block_resources:
+        options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+
+    driver = webdriver.Chrome(
+        service=Service(),
+        options=options,
+    )
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS}
+        )
+    # setup implicit wait
+    driver.implicitly_wait(3)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+def send_keys(driver, xpath, keys, wait_time=5):
+    element = WebDriverWait(driver, wait_time).until(
+        EC.presence_of_element_located((By.XPATH, xpath))
+    )
+    element.send_keys(keys)
+
+
+def click_btn(driver, xpath, wait_time=5):
+    btn = WebDriverWait(driver, wait_time).until(
+        EC.element_to_be_clickable((By.XPATH, xpath))
+    )
+    ActionChains(driver).move_to_element(btn).click(btn).perform()
+
+
+def wait_for_element(driver, xpath, wait_time=5):
+    return WebDriverWait(driver, wait_time).until(
+        EC.presence_of_element_located((By.XPATH, xpath))
+    )
+
+
+def wait_for_any(driver, xpaths, wait_time=5):
+    WebDriverWait(driver, wait_time).until(
+        EC.any_of(
+            *[EC.presence_of_element_located((By.XPATH, xpath)) for xpath in xpaths]
+        )
+    )
+
+
+def select_option(driver, xpath, text, wait_time=5):
+    element = wait_for_element(driver, xpath, wait_time=wait_time)
+    Select(element).select_by_visible_text(text)
+
+
+class RateLimiter:
+    """_Token bucket rate limiter shared by all workers, one bucket per host_
+
+    Args:
+        rate (float): _requests per second allowed for each host, 0 disables the limit_
+        burst (int, optional): _how many requests can go out back to back_. Defaults to 1.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.buckets = {}
+        self.lock = Lock()
+
+    def acquire(self, url):
+        """_Blocks until a request to the host of url is allowed_"""
+        if not self.rate or self.rate <= 0:
+            return
+        host = urlparse(url).netloc
+        while True:
+            with self.lock:
+                now = monotonic()
+                tokens, updated = self.buckets.get(host, (self.capacity, now))
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            sleep(wait)
+
+
+class HttpFetcher:
+    """_Fetches College Navigator pages with a plain HTTP session, no browser needed_
+
+    Args:
+        base_url (str, optional): _root of College Navigator, can point to a local stub server_. Defaults to BASE_URL.
+        timeout (int, optional): _seconds to wait for each response_. Defaults to 30.
+        pool_size (int, optional): _number of keep-alive connections to keep per host_. Defaults to 10.
+        rate_limiter (_RateLimiter_, optional): _limiter shared with the other workers_. Defaults to None.
+        cache (_PageCache_, optional): _page cache shared with the other workers_. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        base_url=BASE_URL,
+        timeout=30,
+        pool_size=10,
+        rate_limiter=None,
+        cache=None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT})
+
+    def get(self, url, params=None):
+        if self.cache is None:
+            return self.download(url, params)
+
+        key = cache_key(url, params)
+        entry = self.cache.lookup(key)
+        if entry and (entry["fresh"] or self.cache.offline):
+            return entry["html"]
+        if self.cache.offline:
+            raise CacheMiss(key)
+
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = self.download(key, headers=headers, raw=True)
+        if response.status_code == 304 and entry:
+            self.cache.touch(key, revalidated=True)
+            return entry["html"]
+        response.raise_for_status()
+        self.cache.put(
+            key,
+            response.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.text
+
+    def download(self, url, params=None, headers=None, raw=False):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(url)
+        run_metrics.count_page()
+        response = self.session.get(
+            url, params=params, headers=headers, timeout=self.timeout
+        )
+        if raw:
+            return response
+        response.raise_for_status()
+        return response.text
+
+    def search(self, institute_name, state, complete_state_name):
+        """_Returns the html of the first search results page_"""
+        return self.get(self.base_url, params={"q": institute_name, "s": state})
+
+    def next_page(self, response):
+        """_Returns the html of the next results page, or None on the last page_"""
+        href = response.xpath(NEXT_PAGE_XPATH + "/@href").get()
+        if not href:
+            return None
+        return self.get(urljoin(self.base_url, href))
+
+    def profile(self, university_url):
+        """_Returns the html of a school profile page given its relative url_"""
+        return self.get(urljoin(self.base_url, university_url))
+
+    def close(self):
+        self.session.close()
+
+
+class SeleniumFetcher:
+    """_Fetches College Navigator pages by driving a real Chrome browser_
+
+    The browser is health checked before every search and profile page, and
+    replaced when it stopped answering, after a page failed, or after max_pages
+    pages so a long run does not keep a bloated browser.
+
+    Args:
+        base_url (str, optional): _root of College Navigator_. Defaults to BASE_URL.
+        headless (bool, optional): _whether to run chrome in headless mode or not_. Defaults to True.
+        rate_limiter (_RateLimiter_, optional): _limiter shared with the other workers_. Defaults to None.
+        max_pages (int, optional): _pages loaded before the browser is recycled, 0 never recycles_. Defaults to 200.
+        block_resources (bool, optional): _whether to block images, stylesheets, fonts and analytics_. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        base_url=BASE_URL,
+        headless=True,
+        rate_limiter=None,
+        max_pages=200,
+        block_resources=True,
+    ):
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.headless = headless
+        self.max_pages = max_pages
+        self.block_resources = block_resources
+        self.driver = None
+        self.pages = 0
+
+    def throttle(self):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(self.base_url)
+
+    def healthy(self):
+        try:
+            self.driver.execute_script("return document.readyState")
+            return True
+        except WebDriverException:
+            return False
+
+    def quit_driver(self):
+        driver, self.driver = self.driver, None
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def ensure_driver(self):
+        """_Starts a new browser if there is none, the current one is unhealthy or it loaded max_pages pages_"""
+        if self.driver is not None:
+            worn_out = self.max_pages and self.pages >= self.max_pages
+            if worn_out or not self.healthy():
+                print("Recycling the browser after {} pages".format(self.pages))
+                self.quit_driver()
+        if self.driver is None:
+            self.driver = bot_setup(
+                headless=self.headless, block_resources=self.block_resources
+            )
+            self.pages = 0
+        self.pages += 1
+        return self.driver
+
+    def load(self, step, *args):
+        """_Runs a page step, a browser that failed in it is dropped so the retry starts on a fresh one_"""
+        try:
+            return step(*args)
+        except WebDriverException:
+            print("Browser failed, it is replaced on the next attempt")
+            self.quit_driver()
+            raise
+
+    def search(self, institute_name, state, complete_state_name):
+        return self.load(self.load_search, institute_name, complete_state_name)
+
+    def load_search(self, institute_name, complete_state_name):
+        driver = self.ensure_driver()
+        run_metrics.count_page()
+        self.throttle()
+        driver.get(urljoin(self.base_url, "?s=IL&pg=3&id=144005#enrolmt"))
+
+        WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.XPATH, SEARCH_INPUT_XPATH))
+        )
+        send_keys(driver, xpath=SEARCH_INPUT_XPATH, keys=Keys.CONTROL + "a")
+        send_keys(driver, xpath=SEARCH_INPUT_XPATH, keys=Keys.DELETE)
+        send_keys(driver, xpath=SEARCH_INPUT_XPATH, keys=institute_name)
+        # set the dropdown value directly instead of typing the state name
+        select_option(driver, xpath=STATE_SELECT_XPATH, text=complete_state_name)
+        self.throttle()
+        send_keys(driver, xpath=STATE_SELECT_XPATH, keys=Keys.ENTER)
+        try:
+            wait_for_any(
+                driver, [RESULTS_TABLE_XPATH, NO_RESULTS_XPATH], wait_time=10
+            )
+        except TimeoutException:
+            # the caller sees the missing results table in the page source
+            pass
+        return driver.page_source
+
+    def next_page(self, response):
+        if not response.xpath(NEXT_PAGE_XPATH):
+            return None
+        return self.load(self.load_next_page)
+
+    def load_next_page(self):
+        # the next page is a postback of the current one, so it stays on the same browser
+        self.pages += 1
+        run_metrics.count_page()
+        old_table = self.driver.find_element(By.XPATH, RESULTS_TABLE_XPATH)
+        self.throttle()
+        click_btn(self.driver, xpath=NEXT_PAGE_XPATH)
+        try:
+            WebDriverWait(self.driver, 10).until(EC.staleness_of(old_table))
+            wait_for_element(self.driver, xpath=RESULTS_TABLE_XPATH)
+        except TimeoutException:
+            return None
+        return self.driver.page_source
+
+    def profile(self, university_url):
+        return self.load(self.load_profile, university_url)
+
+    def load_profile(self, university_url):
+        driver = self.ensure_driver()
+        run_metrics.count_page()
+        self.throttle()
+        driver.get(urljoin(self.base_url, university_url))
+        try:
+            wait_for_element(driver, xpath=PROFILE_HEADER_XPATH, wait_time=10)
+        except TimeoutException:
+            pass
+        return driver.page_source
+
+    def close(self):
+        self.quit_driver()
+
+
+class PageRecorder:
+    """_Wraps a fetcher and saves every page it loads, to build an offline corpus for bench.py_
+
+    Args:
+        fetcher (_HttpFetcher | SeleniumFetcher_): _fetch backend to wrap_
+        save_dir (_str_): _directory the html pages are written to_
+    """
+
+    def __init__(self, fetcher, save_dir):
+        self.fetcher = fetcher
+        self.save_dir = save_dir
+        os.makedirs(save_dir, exist_ok=True)
+
+    def save(self, html):
+        name = hashlib.sha1(html.encode("utf-8")).hexdigest() + ".html"
+        with open(os.path.join(self.save_dir, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        return html
+
+    def search(self, institute_name, state, complete_state_name):
+        return self.save(
+            self.fetcher.search(institute_name, state, complete_state_name)
+        )
+
+    def next_page(self, response):
+        html = self.fetcher.next_page(response)
+        return None if html is None else self.save(html)
+
+    def profile(self, university_url):
+        return self.save(self.fetcher.profile(university_url))
+
+    def close(self):
+        self.fetcher.close()
+
+
+# options only the browser engine takes
+SELENIUM_OPTIONS = ("headless", "max_pages", "block_resources")
+
+ENGINES = {
+    "http": HttpFetcher,
+    "selenium": SeleniumFetcher,
+}
+
+
+def get_fetcher(engine="http", **kwargs):
+    """_This function is used to create a fetch backend by its name_
+
+    Args:
+        engine (str, optional): _name of the backend, "http" or "selenium"_. Defaults to "http".
+        save_html (str, optional): _directory to save every fetched page to_. Defaults to None.
+        **kwargs: _passed on to the backend class_
+
+    Returns:
+        _HttpFetcher | SeleniumFetcher | PageRecorder_: _the fetch backend to be used_
+    """
+    save_html = kwargs.pop("save_html", None)
+    if engine == "http":
+        for option in SELENIUM_OPTIONS:
+            kwargs.pop(option, None)
+    else:
+        # pages of the browser engine come from form posts, they are not cached
+        kwargs.pop("cache", None)
+    fetcher = ENGINES[engine](**kwargs)
+    if save_html:
+        fetcher = PageRecorder(fetcher, save_html)
+    return fetcher
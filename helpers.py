@@ -0,0 +1,79 @@
+import random
+import us
+
+
+# helper function for getting values from selector object
+def parse(response, xpath, get_method="get", comma_join=False, space_join=True):
+    """_This function is used to get values from selector object by using xpath expressions_
+
+    Args:
+        response (_scrapy.Selector_): _A selector object on which we can use xpath expressions_
+        xpath_str (_str_): _xpath expression to be used_
+        get_method (str, optional): _whether to get first element or all elements_. Defaults to "get".
+        comma_join (bool, optional): _if we are getting all elements whether to join on comma or not_. Defaults to False.
+        space_join (bool, optional): _if we are getting all elements whether to join on space or not_. Defaults to False.
+
+    Returns:
+        _str_: _resultant value of using xpath expression on the scrapy.Selector object_
+    """
+    value = ""
+    if get_method == "get":
+        value = response.xpath(xpath).get()
+        value = (value or "").strip()
+    elif get_method == "getall":
+        value = response.xpath(xpath).getall()
+        if value:
+            if comma_join:
+                value = " ".join(
+                    ", ".join([str(x).strip() for x in value]).split()
+                ).strip()
+                value = (value or "").strip()
+            elif space_join:
+                value = " ".join(
+                    " ".join([str(x).strip() for x in value]).split()
+                ).strip()
+                value = (value or "").strip()
+        else:
+            value = ""
+    return value
+
+
+def get_state_full_name(abbreviation):
+    try:
+        state = us.states.lookup(abbreviation)
+        return state.name
+    except:
+        return False
+
+
+def get_complete_state_name(state):
+    """_This function is used to get the full state name shown on College Navigator from an abbreviation_"""
+    complete_state_name = get_state_full_name(state.strip())
+    if not complete_state_name:
+        if state.strip() == "DC":
+            complete_state_name = "District of Columbia"
+    return complete_state_name
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """_This function is used to get the wait time before retrying, exponential backoff with jitter_
+
+    Args:
+        attempt (_int_): _number of the attempt that just failed, starting at 0_
+        base (float, optional): _wait time after the first failure_. Defaults to 1.0.
+        cap (float, optional): _longest wait time_. Defaults to 30.0.
+
+    Returns:
+        _float_: _seconds to wait_
+    """
+    delay = min(cap, base * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# special characters and spaces removed by clean_string
+CLEAN_TABLE = str.maketrans("", "", "!@#$%^&*()_-+={}[]|\\:;'<>,.?/~` ")
+
+
+def clean_string(input_string):
+    """_This function is used to remove special characters and spaces from a string and lowercase it_"""
+    return input_string.translate(CLEAN_TABLE).lower()
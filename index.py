@@ -0,0 +1,159 @@
+import argparse
+import csv
+import json
+import os
+from threading import Lock
+from helpers import clean_string, get_complete_state_name
+from matching import best_match
+
+
+class InstitutionIndex:
+    """_Local index of institution name/city/state to profile url and OPE ID_
+
+    Lets the bot open a profile page directly instead of searching and paging
+    through results. It is filled from every results page the bot scans, from
+    every school it scrapes, or at once from an IPEDS directory file.
+
+    Args:
+        filepath (str, optional): _json file the index is loaded from and saved to_. Defaults to None.
+        threshold (float, optional): _lowest matching.best_match confidence accepted by fuzzy lookups_. Defaults to 0.85.
+    """
+
+    def __init__(self, filepath=None, threshold=0.85):
+        self.filepath = filepath
+        self.threshold = threshold
+        self.lock = Lock()
+        self.entries = {}
+        self.by_place = {}
+        self.changed = False
+        if filepath and os.path.exists(filepath):
+            with open(filepath, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self.insert(entry)
+
+    @staticmethod
+    def make_key(name, city, complete_state_name):
+        return (
+            clean_string(name),
+            clean_string(city),
+            clean_string(complete_state_name),
+        )
+
+    def insert(self, entry):
+        key = self.make_key(entry["name"], entry["city"], entry["state"])
+        self.entries[key] = entry
+        self.by_place.setdefault(key[1:], set()).add(key)
+
+    def add(self, name, city, complete_state_name, url, opeid=""):
+        """_Adds or updates an institution, an empty opeid keeps the one already known_"""
+        if not (name and url):
+            return
+        key = self.make_key(name, city, complete_state_name)
+        with self.lock:
+            known = self.entries.get(key)
+            opeid = opeid or (known or {}).get("opeid", "")
+            if known and known["url"] == url and known.get("opeid", "") == opeid:
+                return
+            self.insert(
+                {
+                    "name": name,
+                    "city": city,
+                    "state": complete_state_name,
+                    "url": url,
+                    "opeid": opeid,
+                }
+            )
+            self.changed = True
+
+    def lookup(self, name, city, complete_state_name):
+        """_This function is used to find an institution without going to the network_
+
+        Tries the exact cleaned (name, city, state) first, then scores the schools of
+        the same city and state with matching.best_match. A school of another city is
+        never returned, it is another campus even with the very same name.
+
+        Returns:
+            _dict_: _entry with name, city, state, url and opeid, or None_
+        """
+        key = self.make_key(name, city, complete_state_name)
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+
+            best, _ = best_match(
+                name,
+                city,
+                complete_state_name,
+                (
+                    (
+                        self.entries[other]["name"],
+                        self.entries[other]["city"],
+                        self.entries[other]["state"],
+                        other,
+                    )
+                    for other in self.by_place.get(key[1:], ())
+                ),
+                threshold=self.threshold,
+            )
+            return self.entries[best] if best else None
+
+    def save(self, filepath=None):
+        filepath = filepath or self.filepath
+        with self.lock:
+            if not (filepath and self.changed):
+                return
+            entries = sorted(
+                self.entries.values(),
+                key=lambda entry: (entry["state"], entry["city"], entry["name"]),
+            )
+            tmp_path = filepath + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, filepath)
+            self.changed = False
+
+
+def load_ipeds_directory(index, filepath, encoding="latin-1"):
+    """_This function is used to fill the index from an IPEDS institutional characteristics (HD) csv file_
+
+    Args:
+        index (_InstitutionIndex_): _index to fill_
+        filepath (_str_): _csv with the UNITID, INSTNM, CITY, STABBR and OPEID columns_
+        encoding (str, optional): _encoding of the csv file_. Defaults to "latin-1".
+
+    Returns:
+        _int_: _number of institutions added_
+    """
+    count = 0
+    with open(filepath, "r", encoding=encoding, newline="") as f:
+        for row in csv.DictReader(f):
+            row = {key.strip().upper(): value for key, value in row.items() if key}
+            complete_state_name = get_complete_state_name(row["STABBR"])
+            if not complete_state_name:
+                continue
+            index.add(
+                row["INSTNM"].strip(),
+                row["CITY"].strip(),
+                complete_state_name,
+                "?id={}".format(row["UNITID"].strip()),
+                opeid=row.get("OPEID", "").strip(),
+            )
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the institution index from an IPEDS directory (HD) csv file"
+    )
+    parser.add_argument("directory", help="IPEDS HD csv file, e.g. hd2022.csv")
+    parser.add_argument(
+        "--index", default="institutions.json", help="index file to update"
+    )
+    parser.add_argument("--encoding", default="latin-1", help="encoding of the csv")
+    args = parser.parse_args()
+
+    index = InstitutionIndex(args.index)
+    count = load_ipeds_directory(index, args.directory, encoding=args.encoding)
+    index.save()
+    print("{} institutions added, {} in {}".format(count, len(index.entries), args.index))
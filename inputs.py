@@ -0,0 +1,98 @@
+import json
+import sys
+import pandas as pd
+from helpers import get_complete_state_name
+from journal import record_key
+
+
+INPUT_FORMATS = ("auto", "csv", "jsonl")
+INPUT_COLUMNS = ("INST_NAME", "CITY", "STATE")
+
+
+def read_csv_rows(f, chunksize):
+    # every value is read as text, so names like "1" or empty cities stay strings
+    for chunk in pd.read_csv(
+        f, dtype=str, keep_default_na=False, chunksize=chunksize
+    ):
+        yield from chunk.to_dict(orient="records")
+
+
+def read_jsonl_rows(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def normalize_record(inp_rec):
+    """_This function is used to normalize an input record once, before it is queued_
+
+    Adds STATE_NAME, the full state name shown on College Navigator ("" for an
+    unknown state, such a row is not searched), and KEY, the cleaned name|city|state
+    key used to de-duplicate rows and by the run journal.
+
+    Args:
+        inp_rec (_dict_): _input row with INST_NAME, CITY and STATE_
+
+    Returns:
+        _dict_: _the row with text values, STATE_NAME and KEY_
+    """
+    inp_rec = dict(inp_rec)
+    for column in INPUT_COLUMNS:
+        value = inp_rec.get(column)
+        inp_rec[column] = "" if value is None else str(value)
+    inp_rec["STATE_NAME"] = get_complete_state_name(inp_rec["STATE"]) or ""
+    inp_rec["KEY"] = record_key(inp_rec)
+    return inp_rec
+
+
+class InputStream:
+    """_Reads the input rows lazily from a csv or json lines file, or from stdin_
+
+    Rows are read in chunks, normalized once and yielded with their row number,
+    repeated (name, city, state) rows are dropped, so only the set of keys seen so
+    far is kept in memory. Consumers pull rows as they have room for them.
+
+    Args:
+        source (_str_): _path of the input file, "-" for stdin_
+        input_format (str, optional): _"csv", "jsonl" or "auto" to pick it from the file extension_. Defaults to "auto".
+        chunksize (int, optional): _rows read from a csv file at a time_. Defaults to 1000.
+    """
+
+    def __init__(self, source, input_format="auto", chunksize=1000):
+        self.source = source
+        self.input_format = input_format
+        self.chunksize = chunksize
+        self.rows = 0
+        self.duplicates = 0
+
+    def resolve_format(self):
+        if self.input_format != "auto":
+            return self.input_format
+        if self.source.lower().endswith((".jsonl", ".ndjson")):
+            return "jsonl"
+        return "csv"
+
+    def read_rows(self, f):
+        if self.resolve_format() == "jsonl":
+            return read_jsonl_rows(f)
+        return read_csv_rows(f, self.chunksize)
+
+    def __iter__(self):
+        if self.source == "-":
+            yield from self.unique(self.read_rows(sys.stdin))
+            return
+        with open(self.source, "r", encoding="utf-8", newline="") as f:
+            yield from self.unique(self.read_rows(f))
+
+    def unique(self, rows):
+        seen = set()
+        for inp_rec in rows:
+            row_idx = self.rows
+            self.rows += 1
+            inp_rec = normalize_record(inp_rec)
+            if inp_rec["KEY"] in seen:
+                self.duplicates += 1
+                continue
+            seen.add(inp_rec["KEY"])
+            yield row_idx, inp_rec
@@ -0,0 +1,105 @@
+import json
+import os
+from datetime import datetime
+from helpers import clean_string
+from output import SCHOOLS_FILE, read_jsonl
+
+
+JOURNAL_FILE = "journal.jsonl"
+
+SUCCESS = "success"
+NOT_FOUND = "not_found"
+FAILED = "failed"
+# delta mode: the profile did not change since the earlier run, its rows were copied
+UNCHANGED = "unchanged"
+
+
+def record_key(inp_rec):
+    """_This function is used to get the normalized (INST_NAME, CITY, STATE) key of an input record_"""
+    return "|".join(
+        clean_string(str(inp_rec[column]).strip())
+        for column in ("INST_NAME", "CITY", "STATE")
+    )
+
+
+class RunJournal:
+    """_Append-only log of the status of every input record, used to resume a run_
+
+    The last entry of a key wins. School rows already in schools.jsonl count as
+    success even if the process died before their journal entry was written.
+
+    Args:
+        store_dir (_str_): _directory of the run, next to schools.jsonl and programs.jsonl_
+    """
+
+    def __init__(self, store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+        filepath = os.path.join(store_dir, JOURNAL_FILE)
+
+        self.entries = {}
+        for entry in read_jsonl(filepath):
+            self.entries[entry["key"]] = entry
+        for school_items in read_jsonl(os.path.join(store_dir, SCHOOLS_FILE)):
+            key = record_key(
+                {
+                    "INST_NAME": school_items["School_Name"],
+                    "CITY": school_items["City"],
+                    "STATE": school_items["State"],
+                }
+            )
+            if self.status(key) not in (SUCCESS, UNCHANGED):
+                self.entries[key] = {
+                    "key": key,
+                    "status": SUCCESS,
+                    "OPEID": school_items.get("OPEID", ""),
+                }
+
+        self.file = open(filepath, "a", encoding="utf-8")
+
+    def status(self, key):
+        entry = self.entries.get(key)
+        return entry["status"] if entry else None
+
+    def record(self, inp_rec, status, opeid="", content_hash=""):
+        """_Writes the status of an input record to the journal_
+
+        Args:
+            inp_rec (_dict_): _normalized input record with INST_NAME, CITY, STATE and KEY_
+            status (_str_): _SUCCESS, NOT_FOUND, FAILED or UNCHANGED_
+            opeid (str, optional): _OPE ID of the school when it was found_. Defaults to "".
+            content_hash (str, optional): _hash of the profile sections, used by the next delta run_. Defaults to "".
+        """
+        key = inp_rec["KEY"]
+        entry = {
+            "key": key,
+            "INST_NAME": inp_rec["INST_NAME"],
+            "CITY": inp_rec["CITY"],
+            "STATE": inp_rec["STATE"],
+            "status": status,
+            "OPEID": opeid,
+            "hash": content_hash,
+            "time": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.entries[key] = entry
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def should_process(self, inp_rec, mode):
+        """_Tells whether an input record has to be scraped in the given run mode_
+
+        Args:
+            inp_rec (_dict_): _normalized input record with KEY_
+            mode (_str_): _"all", "resume" (pending and failed rows) or "retry-failed" (failed rows only)_
+
+        Returns:
+            _bool_: _True if the record has to be scraped_
+        """
+        status = self.status(inp_rec["KEY"])
+        if mode == "resume":
+            return status not in (SUCCESS, NOT_FOUND, UNCHANGED)
+        if mode == "retry-failed":
+            return status == FAILED
+        return True
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,160 @@
+import re
+import string
+from functools import lru_cache
+from helpers import clean_string
+
+
+# apostrophes are dropped ("St. John's" -> "johns"), other punctuation splits words
+TOKEN_TABLE = str.maketrans(
+    {
+        **{char: " " for char in string.punctuation},
+        "'": None,
+        "’": None,
+    }
+)
+# words that say nothing about which school it is
+STOP_WORDS = frozenset(("the", "of", "and", "at", "in", "for", "a"))
+# words shared by many schools, they count for less than a distinctive word
+GENERIC_WORDS = frozenset(
+    (
+        "university",
+        "college",
+        "institute",
+        "school",
+        "community",
+        "state",
+        "campus",
+        "main",
+        "center",
+        "academy",
+    )
+)
+GENERIC_WEIGHT = 0.25
+# what follows the system name in a campus name, e.g. "-San Diego" or " at Dallas"
+CAMPUS_SUFFIX = re.compile(r"(\s*[-–]\s*|\s+at\s+)\w")
+SYNONYMS = {
+    "univ": "university",
+    "st": "saint",
+    "mt": "mount",
+    "ft": "fort",
+    "inst": "institute",
+    "tech": "technology",
+}
+
+# lowest confidence of a match, and the confidence at which no better match is looked for
+MATCH_THRESHOLD = 0.65
+SURE_THRESHOLD = 0.9
+
+# normalized inputs are seen again on every results row and every page
+normalize = lru_cache(maxsize=65536)(clean_string)
+
+
+@lru_cache(maxsize=65536)
+def name_tokens(name):
+    """_Returns the set of normalized words of a school name, without stop words_"""
+    words = str(name).lower().translate(TOKEN_TABLE).split()
+    return frozenset(
+        SYNONYMS.get(word, word) for word in words if word not in STOP_WORDS
+    )
+
+
+def token_weight(token):
+    return GENERIC_WEIGHT if token in GENERIC_WORDS else 1.0
+
+
+def name_similarity(name, other_name, city=""):
+    """_Similarity of the words of two school names, generic words like "university" weigh less_
+
+    Half of it is the weighted Jaccard similarity of the words, the other half
+    drops with every word of name that other_name lacks and every distinctive word
+    other_name adds, so "Harvard" is close to "Harvard University" but not to
+    "Harvard Extension School". Words of other_name that are the input city, like
+    "Ann Arbor" in "University of Michigan-Ann Arbor", are left out. Only names
+    identical after clean_string score 1.0.
+
+    Args:
+        name (_str_): _school name from the input file_
+        other_name (_str_): _name of the candidate school_
+        city (str, optional): _city from the input file_. Defaults to "".
+
+    Returns:
+        _float_: _similarity between 0 and 1_
+    """
+    if normalize(name) == normalize(other_name):
+        return 1.0
+    tokens = name_tokens(name)
+    other_tokens = name_tokens(other_name) - (name_tokens(city) - tokens)
+    shared = sum(token_weight(token) for token in tokens & other_tokens)
+    if not shared:
+        return 0.0
+    union = sum(token_weight(token) for token in tokens | other_tokens)
+    # a word of name missing from other_name costs its full weight, even a generic
+    # one, so "Boston College" is not taken for "Boston University"
+    missing = len(tokens - other_tokens)
+    # so does a distinctive word only other_name has, e.g. "Extension"
+    extra = len(other_tokens - tokens - GENERIC_WORDS)
+    return min(0.5 * shared / union + 0.5 * shared / (shared + missing + extra), 0.99)
+
+
+@lru_cache(maxsize=65536)
+def plain_name(name):
+    words = str(name).lower().split()
+    if words[:1] == ["the"]:
+        words = words[1:]
+    return " ".join(words)
+
+
+def is_campus_of(name, other_name):
+    """_Tells whether other_name is name followed by a campus, like "University of California-San Diego"_"""
+    name, other_name = plain_name(name), plain_name(other_name)
+    return bool(
+        name
+        and other_name.startswith(name)
+        and CAMPUS_SUFFIX.match(other_name, len(name))
+    )
+
+
+def match_score(name, city, state, other_name, other_city, other_state):
+    """_This function is used to score how well a candidate school matches the input school_
+
+    The state and the city have to be the same, a school of another city is another
+    campus even with the very same name. A campus of the input name in the
+    same city, like "University of California-San Diego" in La Jolla for
+    "University of California", is always a match.
+
+    Returns:
+        _float_: _confidence between 0 and 1_
+    """
+    if normalize(state) != normalize(other_state):
+        return 0.0
+    if normalize(city) != normalize(other_city):
+        return 0.0
+    score = name_similarity(name, other_name, city)
+    if is_campus_of(name, other_name):
+        score = max(score, MATCH_THRESHOLD)
+    return score
+
+
+def best_match(name, city, state, candidates, threshold=MATCH_THRESHOLD):
+    """_This function is used to pick the candidate that best matches the input school_
+
+    Args:
+        name (_str_): _school name from the input file_
+        city (_str_): _city from the input file_
+        state (_str_): _full state name from the input file_
+        candidates (_iterable_): _(name, city, state, payload) tuples_
+        threshold (float, optional): _lowest confidence accepted_. Defaults to MATCH_THRESHOLD.
+
+    Returns:
+        _tuple_: _(payload, confidence) of the best candidate, payload is None if no candidate reaches threshold_
+    """
+    best, best_score = None, 0.0
+    for other_name, other_city, other_state, payload in candidates:
+        score = match_score(name, city, state, other_name, other_city, other_state)
+        if score > best_score:
+            best, best_score = payload, score
+            if score == 1.0:
+                break
+    if best_score < threshold:
+        return None, best_score
+    return best, best_score
@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, time
+
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# upper bounds of the pages-per-school histogram buckets
+PAGES_BUCKETS = (1, 2, 3, 4, 5, 7, 10, 20)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """_Estimates the q quantile by interpolating inside its bucket, like prometheus histogram_quantile_"""
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for idx, bucket_count in enumerate(self.counts[:-1]):
+            upper = self.buckets[idx]
+            if bucket_count and seen + bucket_count >= rank:
+                value = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(value, self.max)
+            seen += bucket_count
+            lower = upper
+        return self.max
+
+    def cumulative(self):
+        total = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            total += bucket_count
+            yield bound, total
+        yield "+Inf", self.count
+
+
+class RunMetrics:
+    """_Collects the latency of every pipeline stage and per-school counters, shared by all workers_
+
+    Stages are timed with the phase() context manager. Between begin_record() and
+    end_record() the stages of a worker thread are also added to the current
+    school, which is then written as one json line to the json log.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stages = {}
+        self.saved = {}
+        self.schools = {}
+        self.retries = 0
+        self.pages = Histogram(PAGES_BUCKETS)
+        self.started = perf_counter()
+        self.json_log = None
+
+    def open_json_log(self, filepath):
+        self.json_log = open(filepath, "a", encoding="utf-8")
+
+    @contextmanager
+    def phase(self, name, saved=0.0):
+        """_Times the body of the with block as one run of the stage_
+
+        Args:
+            name (_str_): _name of the stage, e.g. "search" or "profile"_
+            saved (float, optional): _seconds of fixed sleep the old flow spent on this step_. Defaults to 0.0.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start, saved)
+
+    def record(self, name, seconds, saved=0.0):
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = Histogram(LATENCY_BUCKETS)
+                self.saved[name] = 0.0
+            self.stages[name].observe(seconds)
+            self.saved[name] += saved
+        school = getattr(self.local, "school", None)
+        if school is not None:
+            school["stages"][name] = school["stages"].get(name, 0.0) + seconds
+
+    def count_page(self):
+        """_Counts a page downloaded for the school of the current worker thread, pages served from the cache are not counted_"""
+        school = getattr(self.local, "school", None)
+        if school is not None:
+            school["pages"] += 1
+
+    def begin_record(self, row):
+        self.local.school = {"row": row, "stages": {}, "pages": 0}
+
+    def end_record(self, status, attempts):
+        """_Closes the school of the current worker thread and updates the run counters_"""
+        school = getattr(self.local, "school", None)
+        self.local.school = None
+        if school is None:
+            return
+        with self.lock:
+            self.schools[status] = self.schools.get(status, 0) + 1
+            self.retries += attempts - 1
+            self.pages.observe(school["pages"])
+            if self.json_log:
+                event = {
+                    "time": round(time(), 3),
+                    "event": "school",
+                    "row": school["row"],
+                    "status": status,
+                    "attempts": attempts,
+                    "pages": school["pages"],
+                    "stages": {
+                        name: round(seconds, 4)
+                        for name, seconds in school["stages"].items()
+                    },
+                }
+                self.json_log.write(json.dumps(event) + "\n")
+                self.json_log.flush()
+
+    def report(self):
+        """_Returns the summary table of the run as a string_"""
+        lines = [
+            "{:<10} {:>7} {:>9} {:>8} {:>8} {:>8} {:>8} {:>12}".format(
+                "stage",
+                "count",
+                "total s",
+                "mean s",
+                "p50 s",
+                "p95 s",
+                "max s",
+                "sleep saved",
+            )
+        ]
+        with self.lock:
+            for name, histogram in sorted(self.stages.items()):
+                row_format = (
+                    "{:<10} {:>7} {:>9.2f} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f} {:>12.1f}"
+                )
+                lines.append(
+                    row_format.format(
+                        name,
+                        histogram.count,
+                        histogram.sum,
+                        histogram.sum / histogram.count,
+                        histogram.quantile(0.5),
+                        histogram.quantile(0.95),
+                        histogram.max,
+                        self.saved[name],
+                    )
+                )
+            done = sum(self.schools.values())
+            lines.append(
+                "schools {} ({}), not found rate {:.1%}, retries {}, pages/school {:.2f}".format(
+                    done,
+                    ", ".join(
+                        "{} {}".format(status, count)
+                        for status, count in sorted(self.schools.items())
+                    )
+                    or "-",
+                    self.schools.get("not_found", 0) / done if done else 0,
+                    self.retries,
+                    self.pages.sum / self.pages.count if self.pages.count else 0,
+                )
+            )
+            lines.append(
+                "wall time {:.1f}s, fixed sleeps avoided {:.1f}s (summed over workers)".format(
+                    perf_counter() - self.started, sum(self.saved.values())
+                )
+            )
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """_Returns the metrics in the prometheus text exposition format_"""
+        lines = [
+            "# HELP nces_stage_seconds Latency of each stage of the scraping pipeline.",
+            "# TYPE nces_stage_seconds histogram",
+        ]
+        with self.lock:
+            for name, histogram in sorted(self.stages.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        'nces_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(
+                            name, bound, count
+                        )
+                    )
+                lines.append(
+                    'nces_stage_seconds_sum{{stage="{}"}} {}'.format(name, histogram.sum)
+                )
+                lines.append(
+                    'nces_stage_seconds_count{{stage="{}"}} {}'.format(
+                        name, histogram.count
+                    )
+                )
+            lines.append(
+                "# HELP nces_fixed_sleep_avoided_seconds_total Fixed sleeps of the old browser flow not spent."
+            )
+            lines.append("# TYPE nces_fixed_sleep_avoided_seconds_total counter")
+            for name, saved in sorted(self.saved.items()):
+                lines.append(
+                    'nces_fixed_sleep_avoided_seconds_total{{stage="{}"}} {}'.format(
+                        name, saved
+                    )
+                )
+            lines.append("# HELP nces_schools_total Scraped input rows by status.")
+            lines.append("# TYPE nces_schools_total counter")
+            for status, count in sorted(self.schools.items()):
+                lines.append(
+                    'nces_schools_total{{status="{}"}} {}'.format(status, count)
+                )
+            lines.append("# HELP nces_retries_total Attempts repeated after a failure.")
+            lines.append("# TYPE nces_retries_total counter")
+            lines.append("nces_retries_total {}".format(self.retries))
+            lines.append("# HELP nces_pages_per_school Pages fetched for each input row.")
+            lines.append("# TYPE nces_pages_per_school histogram")
+            for bound, count in self.pages.cumulative():
+                lines.append(
+                    'nces_pages_per_school_bucket{{le="{}"}} {}'.format(bound, count)
+                )
+            lines.append("nces_pages_per_school_sum {}".format(self.pages.sum))
+            lines.append("nces_pages_per_school_count {}".format(self.pages.count))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filepath):
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus())
+        # replace at once so a node exporter never reads half a file
+        os.replace(tmp_path, filepath)
+
+    def export_every(self, filepath, interval=10):
+        """_Rewrites the prometheus metrics file every interval seconds in a background thread_"""
+
+        def export():
+            while True:
+                self.write_prometheus(filepath)
+                threading.Event().wait(interval)
+
+        threading.Thread(target=export, daemon=True).start()
+
+    def serve(self, port, host="0.0.0.0"):
+        """_Serves the prometheus metrics on http://host:port/metrics in a background thread_"""
+        run_metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = run_metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        if self.json_log:
+            self.json_log.close()
+            self.json_log = None
+
+
+# metrics shared by the whole run
+run_metrics = RunMetrics()
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import re
+import pandas as pd
+import xlsxwriter
+from schema import CRIME_CATEGORIES, CRIME_TABLES
+
+try:
+    import pyarrow
+except ImportError:
+    # pyarrow is only needed for the parquet and arrow formats
+    pyarrow = None
+
+
+SCHOOLS_FILE = "schools.jsonl"
+PROGRAMS_FILE = "programs.jsonl"
+
+FORMATS = ("xlsx", "parquet", "arrow")
+# columns with few distinct values, stored once per table by the categorical dtype
+CATEGORY_COLUMNS = ("City", "State", "Major", "Program")
+# count columns, always nullable integers whatever a store holds: the enrollment,
+# the applicants and every crime field, with or without its year, e.g.
+# Housing_Arrests_b or Arrests_b_2022
+COUNT_COLUMN = re.compile(
+    r"Total_Enrollment|Applicants_\w+|(?:{})(?:{})_[a-k](?:_\d{{4}})?".format(
+        "|".join(CRIME_TABLES.values()),
+        "|".join(name for name, _, _ in CRIME_CATEGORIES),
+    )
+)
+# cells without a count, "-" is the not applicable marker of the profile pages
+MISSING_COUNTS = ("", "-")
+
+
+class JsonlSink:
+    """_Append-only store of the scraped rows, every school and program row is written exactly once_
+
+    Args:
+        store_dir (_str_): _directory holding schools.jsonl and programs.jsonl, created if missing_
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.schools = open(
+            os.path.join(store_dir, SCHOOLS_FILE), "a", encoding="utf-8"
+        )
+        self.programs = open(
+            os.path.join(store_dir, PROGRAMS_FILE), "a", encoding="utf-8"
+        )
+
+    def write(self, school_items, program_items):
+        """_Appends one school and its program rows, and flushes them to disk_"""
+        for programs in program_items:
+            self.programs.write(json.dumps(programs, ensure_ascii=False) + "\n")
+        self.schools.write(json.dumps(school_items, ensure_ascii=False) + "\n")
+        self.programs.flush()
+        self.schools.flush()
+
+    def close(self):
+        self.schools.close()
+        self.programs.close()
+
+
+def read_jsonl(filepath):
+    """_This function is used to lazily read the rows of a json lines file_"""
+    if not os.path.exists(filepath):
+        return
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def write_sheet(workbook, sheet_name, filepath):
+    # first pass only collects the columns, so rows never have to be held in memory
+    columns = {}
+    for row in read_jsonl(filepath):
+        for key in row:
+            columns.setdefault(key, None)
+    columns = list(columns)
+
+    worksheet = workbook.add_worksheet(sheet_name)
+    header_format = workbook.add_format({"bold": True, "border": 1})
+    for col_idx, column in enumerate(columns):
+        worksheet.write(0, col_idx, column, header_format)
+
+    for row_idx, row in enumerate(read_jsonl(filepath), start=1):
+        for col_idx, column in enumerate(columns):
+            value = row.get(column)
+            if value is not None:
+                worksheet.write(row_idx, col_idx, value)
+
+
+def export_excel(store_dir, output_file_path):
+    """_This function is used to build the xlsx workbook from a JsonlSink store_
+
+    Args:
+        store_dir (_str_): _directory holding schools.jsonl and programs.jsonl_
+        output_file_path (_str_): _path of the xlsx file to create_
+    """
+    workbook = xlsxwriter.Workbook(output_file_path, {"constant_memory": True})
+    write_sheet(workbook, "School", os.path.join(store_dir, SCHOOLS_FILE))
+    write_sheet(workbook, "Program", os.path.join(store_dir, PROGRAMS_FILE))
+    workbook.close()
+
+
+def count_column(values):
+    """_Turns a column of scraped counts like "5,432" into nullable integers, "-" and empty cells are missing_"""
+    text = values.astype("string").str.strip().str.replace(",", "", regex=False)
+    text = text.replace({missing: pd.NA for missing in MISSING_COUNTS})
+    return pd.to_numeric(text, errors="coerce").astype("Int64")
+
+
+def school_frame(store_dir):
+    """_This function is used to read the School table of a store with typed columns_
+
+    The COUNT_COLUMN columns are always nullable integers, city and state
+    categories, Program_IDs a list of integers instead of a ";" joined string and
+    every other column text, so a column has the same type in every store.
+
+    Returns:
+        _pandas.DataFrame_: _one row per scraped school_
+    """
+    frame = pd.DataFrame(list(read_jsonl(os.path.join(store_dir, SCHOOLS_FILE))))
+    for column in frame.columns:
+        if column == "Program_IDs":
+            frame[column] = [
+                [int(x) for x in str(ids).split(";") if x]
+                for ids in frame[column].fillna("")
+            ]
+        elif column in CATEGORY_COLUMNS:
+            frame[column] = frame[column].astype("category")
+        elif COUNT_COLUMN.fullmatch(column):
+            frame[column] = count_column(frame[column])
+        else:
+            frame[column] = frame[column].astype("string")
+    return frame
+
+
+def program_frame(store_dir):
+    """_This function is used to read the Program table of a store, the link table of schools and programs_
+
+    Returns:
+        _pandas.DataFrame_: _one row per (OPEID, major, program) with integer ids_
+    """
+    frame = pd.DataFrame(list(read_jsonl(os.path.join(store_dir, PROGRAMS_FILE))))
+    for column in frame.columns:
+        if column in ("Major_IDs", "Program_IDs"):
+            frame[column] = frame[column].astype("int64")
+        elif column in CATEGORY_COLUMNS:
+            frame[column] = frame[column].astype("category")
+        else:
+            frame[column] = frame[column].astype("string")
+    return frame
+
+
+def export_columnar(store_dir, output_dir, output_format="parquet"):
+    """_This function is used to write the typed School and Program tables as parquet or arrow (feather) files_
+
+    Args:
+        store_dir (_str_): _directory holding schools.jsonl and programs.jsonl_
+        output_dir (_str_): _directory of School.<format> and Program.<format>, created if missing_
+        output_format (str, optional): _"parquet" or "arrow"_. Defaults to "parquet".
+
+    Returns:
+        _list_: _paths of the written files_
+    """
+    if pyarrow is None:
+        raise RuntimeError(
+            "pyarrow is not installed, it is needed for the {} format".format(
+                output_format
+            )
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+    filepaths = []
+    for name, frame in (
+        ("School", school_frame(store_dir)),
+        ("Program", program_frame(store_dir)),
+    ):
+        filepath = os.path.join(output_dir, "{}.{}".format(name, output_format))
+        if output_format == "parquet":
+            frame.to_parquet(filepath, engine="pyarrow", index=False)
+        else:
+            frame.to_feather(filepath)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def export(store_dir, output_path, output_format="xlsx"):
+    """_This function is used to export a store to one of FORMATS_
+
+    Args:
+        store_dir (_str_): _directory holding schools.jsonl and programs.jsonl_
+        output_path (_str_): _xlsx file, or directory of the parquet and arrow tables_
+        output_format (str, optional): _one of FORMATS_. Defaults to "xlsx".
+    """
+    if output_format == "xlsx":
+        export_excel(store_dir, output_path)
+    else:
+        export_columnar(store_dir, output_path, output_format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the xlsx workbook or the parquet/arrow tables from a store of scraped rows"
+    )
+    parser.add_argument("store", help="directory holding schools.jsonl and programs.jsonl")
+    parser.add_argument(
+        "output", help="xlsx file, or directory of the parquet/arrow tables, to create"
+    )
+    parser.add_argument("--format", choices=FORMATS, default="xlsx")
+    args = parser.parse_args()
+    export(args.store, args.output, args.format)
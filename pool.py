@@ -0,0 +1,66 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FetcherPool:
+    """_Gives every worker thread its own fetch backend and reuses it for all of its schools_
+
+    Args:
+        factory (_callable_): _function without arguments that creates a new fetcher_
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.local = threading.local()
+        self.fetchers = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        fetcher = getattr(self.local, "fetcher", None)
+        if fetcher is None:
+            fetcher = self.factory()
+            self.local.fetcher = fetcher
+            with self.lock:
+                self.fetchers.append(fetcher)
+        return fetcher
+
+    def close(self):
+        with self.lock:
+            fetchers, self.fetchers = self.fetchers, []
+        for fetcher in fetchers:
+            try:
+                fetcher.close()
+            except Exception:
+                pass
+
+
+def imap_ordered(func, items, workers=1):
+    """_This function is used to run func over items on a bounded thread pool_
+
+    At most 2 * workers items are in flight at any time, and the results are
+    yielded in the same order as items, whatever order the workers finish in.
+
+    Args:
+        func (_callable_): _function called with one item_
+        items (_iterable_): _items to process_
+        workers (int, optional): _number of worker threads_. Defaults to 1.
+
+    Yields:
+        _tuple_: _(item, result) pairs in input order_
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= workers * 2:
+                item_, future = pending.popleft()
+                yield item_, future.result()
+        while pending:
+            item_, future = pending.popleft()
+            yield item_, future.result()
@@ -0,0 +1,120 @@
+import json
+import os
+from threading import RLock
+from time import monotonic
+
+
+class IdRegistry:
+    """_Keeps the major and program ids, hands out new ones and saves them to ids.json in batches_
+
+    New ids come from a running counter per kind instead of a max() over all ids.
+    Every flush() appends the new ids to ids.json.log and syncs it, so rows written
+    after a flush never use an id that a crash could hand out again. ids.json itself
+    is only rewritten every flush_interval seconds, atomically through a temp file,
+    and the log is replayed on top of it when the registry is loaded. Ids already
+    in the file never change.
+
+    Args:
+        filepath (_str_): _json file with the major_ids and program_ids mappings_
+        flush_interval (float, optional): _min seconds between two rewrites of the file, 0 rewrites it on every flush_. Defaults to 0.
+    """
+
+    KINDS = ("major_ids", "program_ids")
+
+    def __init__(self, filepath, flush_interval=0):
+        self.filepath = filepath
+        self.log_path = filepath + ".log"
+        self.flush_interval = flush_interval
+        self.lock = RLock()
+
+        ids = {}
+        if os.path.exists(filepath):
+            with open(filepath, "r") as f:
+                ids = json.load(f)
+        self.ids = {kind: dict(ids.get(kind, {})) for kind in self.KINDS}
+        replay_log = os.path.exists(self.log_path)
+        if replay_log:
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    try:
+                        kind, name, idx = json.loads(line)
+                    except ValueError:
+                        # a line cut by a crash, its rows were never written
+                        continue
+                    self.ids[kind][name] = idx
+        self.next_ids = {
+            kind: max(self.ids[kind].values(), default=0) + 1 for kind in self.KINDS
+        }
+        # ids handed out after the last rewrite of the file, and how many are in the log
+        self.new_ids = []
+        self.logged = 0
+        self.dirty = replay_log
+        self.flushed_at = monotonic()
+        if replay_log:
+            # fold the log of an interrupted run into the file
+            self.flush(force=True)
+
+    def get_id(self, kind, name):
+        """_Returns the id of name, giving it the next free id if it is new_
+
+        Args:
+            kind (_str_): _"major_ids" or "program_ids"_
+            name (_str_): _name of the major or program_
+
+        Returns:
+            _int_: _id of name_
+        """
+        with self.lock:
+            ids = self.ids[kind]
+            if name not in ids:
+                ids[name] = self.next_ids[kind]
+                self.next_ids[kind] += 1
+                self.new_ids.append((kind, name, ids[name]))
+                self.dirty = True
+            return ids[name]
+
+    def get_ids(self, kind, names):
+        """_Returns the ids of a list of names under one lock, new names get ids in list order_"""
+        with self.lock:
+            return [self.get_id(kind, name) for name in names]
+
+    def major_id(self, name):
+        return self.get_id("major_ids", name)
+
+    def program_id(self, name):
+        return self.get_id("program_ids", name)
+
+    def flush(self, force=False):
+        """_Saves the ids handed out since the last flush, call it before writing rows that use them_
+
+        Args:
+            force (bool, optional): _rewrite the file even if flush_interval has not passed yet_. Defaults to False.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            if not force and monotonic() - self.flushed_at < self.flush_interval:
+                self.append_log()
+                return
+            tmp_path = "{}.{}.tmp".format(self.filepath, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(self.ids, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filepath)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self.new_ids = []
+            self.logged = 0
+            self.dirty = False
+            self.flushed_at = monotonic()
+
+    def append_log(self):
+        if self.logged == len(self.new_ids):
+            return
+        with open(self.log_path, "a") as f:
+            for entry in self.new_ids[self.logged :]:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.logged = len(self.new_ids)
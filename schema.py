@@ -0,0 +1,284 @@
+import re
+from lxml import etree
+
+
+# a crime table, found by the name shown above it, e.g. "On-Campus"
+CRIME_TABLE = etree.XPath(
+    '//div[@id="crime"]//div[@class="tablenames" and text()=$name]'
+    "/following-sibling::table[1]"
+)
+TABLE_HEADERS = etree.XPath("./thead/tr[1]/th")
+OWN_TEXT = etree.XPath("./text()")
+TABLE_BODY_ROWS = etree.XPath("./tbody/tr")
+ROW_CELLS = etree.XPath("./td")
+# every table of a profile section, e.g. the "expenses" or "admsns" div
+SECTION_TABLES = etree.XPath("//div[@id=$section]//table")
+
+# crime tables of the profile page and the prefix of their fields
+CRIME_TABLES = {
+    "On-Campus": "",
+    "On-Campus Student Housing Facilities": "Housing_",
+    "Noncampus": "Noncampus_",
+    "Public Property": "Public_",
+}
+# (field name, category row text, number of rows below the category)
+CRIME_CATEGORIES = (
+    ("Criminal_Offenses", "Criminal Offenses", 11),
+    ("VAWA_Offenses", "VAWA Offenses", 3),
+    ("Arrests", "Arrests", 3),
+    ("Disciplinary_Actions", "Disciplinary Actions", 3),
+)
+
+
+def cell_text(element):
+    return " ".join("".join(element.itertext()).split())
+
+
+def column_suffix(header):
+    """_Turns a column header like "2022-2023" or "Full-time" into a column name suffix_"""
+    return re.sub(r"\W+", "_", header).strip("_")
+
+
+class ProfilePage:
+    """_Wraps a parsed school profile page and caches the tables shared by several fields_
+
+    Args:
+        response (_parsel.Selector_): _selector of the school profile page_
+    """
+
+    def __init__(self, response):
+        self.root = response.root
+        self.crime_tables = {}
+        self.sections = {}
+
+    def crime_table(self, name):
+        """_Reads a crime table in one pass_
+
+        Returns:
+            _dict_: _the header cells of the table, the cells of every row, the last
+            cell text of every row and the [(row index, text)] of every category row_
+        """
+        if name not in self.crime_tables:
+            headers = []
+            rows = []
+            cells = []
+            categories = []
+            for table in CRIME_TABLE(self.root, name=name)[:1]:
+                headers = TABLE_HEADERS(table)[1:]
+                for idx, row in enumerate(TABLE_BODY_ROWS(table)):
+                    row_cells = ROW_CELLS(row)
+                    last_texts = OWN_TEXT(row_cells[-1]) if row_cells else []
+                    cells.append(str(last_texts[0]).strip() if last_texts else "")
+                    rows.append(row_cells[1:])
+                    if row.get("class") == "subrow nb":
+                        categories.append((idx, "".join(row.itertext())))
+            self.crime_tables[name] = {
+                "headers": headers,
+                "rows": rows,
+                "cells": cells,
+                "categories": categories,
+            }
+        return self.crime_tables[name]
+
+    def section_rows(self, section):
+        """_Reads every table row of a profile section in one pass_
+
+        Returns:
+            _list_: _(label of the row, headers of its table, cells after the label) tuples_
+        """
+        if section not in self.sections:
+            rows = []
+            for table in SECTION_TABLES(self.root, section=section):
+                headers = [cell_text(th) for th in TABLE_HEADERS(table)[1:]]
+                for row in table.iter("tr"):
+                    row_cells = [
+                        cell_text(cell) for cell in row if cell.tag in ("td", "th")
+                    ]
+                    if row_cells and row.getparent().tag != "thead":
+                        rows.append((row_cells[0], headers, row_cells[1:]))
+            self.sections[section] = rows
+        return self.sections[section]
+
+
+def text(xpath, transform=None):
+    """_Field holding the first result of an xpath expression, like parse(response, xpath)_
+
+    Args:
+        xpath (_str_): _xpath expression, compiled once here_
+        transform (_callable_, optional): _function applied to the stripped value_. Defaults to None.
+    """
+    compiled = etree.XPath(xpath)
+
+    def extract(page):
+        values = compiled(page.root)
+        value = str(values[0]).strip() if values else ""
+        return transform(value) if transform else value
+
+    return extract
+
+
+def crime_row(page, table, category, row):
+    # position of a row of the table, counted from its category row
+    crime_table = page.crime_table(table)
+    for idx, category_text in crime_table["categories"]:
+        if category in category_text:
+            if idx + row < len(crime_table["cells"]):
+                return idx + row
+            return None
+    return None
+
+
+def crime(table, category, row):
+    """_Field holding the latest year of a crime table row_
+
+    Args:
+        table (_str_): _name of the crime table, e.g. "On-Campus"_
+        category (_str_): _category row the field is under, e.g. "Arrests"_
+        row (_int_): _position of the row below the category row, starting at 1_
+    """
+
+    def extract(page):
+        idx = crime_row(page, table, category, row)
+        return "" if idx is None else page.crime_table(table)["cells"][idx]
+
+    return extract
+
+
+def crime_years(table, category, row):
+    """_Field holding every year of a crime table row, one column per year_
+
+    Same arguments as crime(), the value is a {year: count} dict that
+    extract_fields spreads over columns, see build_schema.
+    """
+
+    def extract(page):
+        idx = crime_row(page, table, category, row)
+        if idx is None:
+            return {}
+        crime_table = page.crime_table(table)
+        return {
+            cell_text(th): cell_text(td)
+            for th, td in zip(crime_table["headers"], crime_table["rows"][idx])
+        }
+
+    return extract
+
+
+def section_row(section, label):
+    """_Field holding every column of the first row starting with label in a profile section_
+
+    Args:
+        section (_str_): _id of the section div, e.g. "expenses"_
+        label (_str_): _start of the text of the first cell of the row, e.g. "In-state tuition"_
+    """
+
+    def extract(page):
+        for row_label, headers, cells in page.section_rows(section):
+            if row_label.startswith(label):
+                if len(headers) != len(cells):
+                    headers = [str(idx) for idx in range(1, len(cells) + 1)]
+                return dict(zip(headers, cells))
+        return {}
+
+    return extract
+
+
+def after_colon(value):
+    return value.split(":")[-1].strip()
+
+
+def crime_fields(table, prefix="", field=crime):
+    """_Builds the fields of every category row of a crime table, e.g. Arrests_a to Arrests_c_"""
+    return {
+        "{}{}_{}".format(prefix, name, letter): field(table, category, row)
+        for name, category, count in CRIME_CATEGORIES
+        for row, letter in zip(range(1, count + 1), "abcdefghijk")
+    }
+
+
+# school fields read from the profile page, in output column order
+PROFILE_SCHEMA = {
+    "OPEID": text(
+        '//span[@class="ipeds"]/text()[contains(., "OPE ID")]', transform=after_colon
+    ),
+    "Total_Enrollment": text(
+        '//th[@scope="col" and text()="Total enrollment"]/following-sibling::th[@scope="col"]/text()'
+    ),
+    "Student Population": text(
+        '//td[@class="srb" and contains(text(), "Student population")]/following-sibling::td[1]/text()'
+    ),
+    **crime_fields("On-Campus"),
+}
+
+# optional groups of fields, read from the same page load as PROFILE_SCHEMA; a name
+# with {} holds a field of several columns, e.g. one per year, and {} is replaced by
+# the column header
+SECTIONS = {
+    "crime_years": {
+        field_name + "_{}": extractor
+        for table, prefix in CRIME_TABLES.items()
+        for field_name, extractor in crime_fields(table, prefix, crime_years).items()
+    },
+    "crime_other": {
+        field_name: extractor
+        for table, prefix in CRIME_TABLES.items()
+        if prefix
+        for field_name, extractor in crime_fields(table, prefix).items()
+    },
+    "tuition": {
+        "In_State_Tuition_{}": section_row("expenses", "In-state tuition"),
+        "In_State_Fees_{}": section_row("expenses", "In-state fees"),
+        "Out_Of_State_Tuition_{}": section_row("expenses", "Out-of-state tuition"),
+        "Out_Of_State_Fees_{}": section_row("expenses", "Out-of-state fees"),
+        "Books_And_Supplies_{}": section_row("expenses", "Books and supplies"),
+    },
+    "admissions": {
+        "Applicants_{}": section_row("admsns", "Number of applicants"),
+        "Percent_Admitted_{}": section_row("admsns", "Percent admitted"),
+        "Percent_Admitted_Enrolled_{}": section_row(
+            "admsns", "Percent admitted who enrolled"
+        ),
+    },
+    "retention": {
+        "Retention_Full_Time_{}": section_row("retgrad", "Full-time"),
+        "Retention_Part_Time_{}": section_row("retgrad", "Part-time"),
+    },
+}
+
+
+def build_schema(sections=()):
+    """_This function is used to add the fields of the requested SECTIONS to PROFILE_SCHEMA_
+
+    Args:
+        sections (_iterable_, optional): _names of SECTIONS to add_. Defaults to ().
+
+    Returns:
+        _dict_: _field name to extractor mapping_
+    """
+    schema = dict(PROFILE_SCHEMA)
+    for section in sections:
+        schema.update(SECTIONS[section])
+    return schema
+
+
+def extract_fields(response, schema=PROFILE_SCHEMA):
+    """_This function is used to run every field of a schema over a profile page_
+
+    Args:
+        response (_parsel.Selector_): _selector of the school profile page_
+        schema (_dict_, optional): _field name to extractor mapping_. Defaults to PROFILE_SCHEMA.
+
+    Returns:
+        _dict_: _column name to extracted value, in schema order_
+    """
+    page = ProfilePage(response)
+    fields = {}
+    for name, extractor in schema.items():
+        value = extractor(page)
+        if isinstance(value, dict):
+            # multi column fields, e.g. one column per year
+            for column, column_value in value.items():
+                fields[name.format(column_suffix(column))] = column_value
+        else:
+            fields[name] = value
+    return fields
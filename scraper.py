@@ -0,0 +1,336 @@
+from itertools import chain
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from lxml import etree
+from parsel import Selector
+from fetchers import (
+    LEGACY_SLEEPS,
+    NO_RESULTS_XPATH,
+    PROFILE_HEADER_XPATH,
+    RESULTS_TABLE_XPATH,
+)
+from metrics import run_metrics
+from delta import content_hash
+from schema import PROFILE_SCHEMA, extract_fields
+from helpers import (
+    parse,
+    get_complete_state_name,
+)
+from matching import SURE_THRESHOLD, best_match
+
+
+# first major row of the programs table, the program rows follow it
+FIRST_MAJOR_ROW = etree.XPath(
+    '(//div[@id="programs"]//table[@class="pmtabular"]/tbody/tr[@class="subrow nb"])[1]'
+)
+CELL_TEXT = etree.XPath("./td/text()")
+FIRST_CELL_TEXT = etree.XPath("./td[1]/text()")
+
+
+def first_text(texts):
+    return texts[0].strip() if texts else ""
+
+
+def find_university_url(
+    fetcher, institute_name, city, state, index=None, complete_state_name=None
+):
+    """_This function is used to search for a school and walk the results pages until it matches the input record_
+
+    Args:
+        fetcher (_HttpFetcher | SeleniumFetcher_): _fetch backend used to load the pages_
+        institute_name (_str_): _name of the school from the input file_
+        city (_str_): _city of the school from the input file_
+        state (_str_): _state abbreviation of the school from the input file_
+        index (_InstitutionIndex_, optional): _index every scanned results row is added to_. Defaults to None.
+        complete_state_name (str, optional): _full state name if already known_. Defaults to None.
+
+    Returns:
+        _tuple_: _(relative url of the school profile page or None if the school was not found, its match confidence)_
+    """
+    complete_state_name = complete_state_name or get_complete_state_name(state)
+
+    search_sleep = (
+        LEGACY_SLEEPS["search"]
+        + LEGACY_SLEEPS["search_state_char"] * len(complete_state_name)
+    )
+    with run_metrics.phase("search", saved=search_sleep):
+        html = fetcher.search(institute_name, state.strip(), complete_state_name)
+    response = Selector(text=html)
+    no_results = parse(response, xpath=NO_RESULTS_XPATH)
+    if no_results or not response.xpath(RESULTS_TABLE_XPATH):
+        print("Results Table not visible...")
+        return None, 0.0
+
+    # an uncertain match only stops the paging if no later page has a better one
+    best_url, best_confidence = None, 0.0
+    while True:
+        with run_metrics.phase("match"):
+            university_url, confidence = match_result_rows(
+                response, institute_name, city, complete_state_name, index=index
+            )
+        if university_url and confidence > best_confidence:
+            best_url, best_confidence = university_url, confidence
+        if best_confidence >= SURE_THRESHOLD:
+            break
+
+        start = perf_counter()
+        html = fetcher.next_page(response)
+        if html is None:
+            break
+        # only a page that was fetched counts, the last page has no next page link
+        run_metrics.record(
+            "paginate", perf_counter() - start, saved=LEGACY_SLEEPS["next_page"]
+        )
+        response = Selector(text=html)
+        if not response.xpath(RESULTS_TABLE_XPATH):
+            break
+
+    if best_url:
+        print("Matched with confidence {:.2f}".format(best_confidence))
+    return best_url, best_confidence
+
+
+def match_result_rows(response, institute_name, city, complete_state_name, index=None):
+    """_This function is used to find the input school among the rows of a results page_
+
+    Every row is scored with matching.best_match, so a longer name that only
+    contains the input name (e.g. "Harvard Extension School" for "Harvard") is
+    not taken for it, and a row in another city than the input one never matches.
+
+    Args:
+        response (_parsel.Selector_): _selector of a search results page_
+        institute_name (_str_): _school name from the input file_
+        city (_str_): _city from the input file_
+        complete_state_name (_str_): _full state name from the input file_
+        index (_InstitutionIndex_, optional): _index every scanned row is added to_. Defaults to None.
+
+    Returns:
+        _tuple_: _(relative url of the best matching school profile or None if no row matches, its confidence)_
+    """
+    university_rows = response.xpath('//table[@class="resultsTable"]/tbody/tr')
+
+    candidates = []
+    for uni_row in university_rows:
+        university_name = parse(uni_row, "./td[2]/a/strong/text()")
+        university_state_from_website_city = parse(
+            uni_row, "./td[2]/text()", get_method="getall"
+        )
+        university_state = university_state_from_website_city.split(",")[-1].strip()
+        university_city = university_state_from_website_city.split(",")[0].strip()
+        university_url = parse(uni_row, "./td[2]/a/@href")
+
+        if index is not None:
+            index.add(
+                university_name, university_city, university_state, university_url
+            )
+        candidates.append(
+            (university_name, university_city, university_state, university_url)
+        )
+
+    return best_match(institute_name, city, complete_state_name, candidates)
+
+
+def parse_profile(response, inp_rec, schema=PROFILE_SCHEMA):
+    """_This function is used to extract the school level fields from a profile page_
+
+    Args:
+        response (_parsel.Selector_): _selector of the school profile page_
+        inp_rec (_dict_): _input record with INST_NAME, CITY and STATE_
+        schema (_dict_, optional): _fields to extract, see schema.build_schema_. Defaults to PROFILE_SCHEMA.
+
+    Returns:
+        _dict_: _school fields, Program_IDs is filled later by assign_program_ids_
+    """
+    page_items = extract_fields(response, schema)
+
+    school_items = {}
+    school_items["OPEID"] = page_items.pop("OPEID")
+    school_items["School_Name"] = inp_rec["INST_NAME"]
+    school_items["City"] = inp_rec["CITY"]
+    school_items["State"] = inp_rec["STATE"]
+    school_items["Program_IDs"] = ""
+    school_items.update(page_items)
+    return school_items
+
+
+def scrape_school(fetcher, inp_rec, index=None, schema=PROFILE_SCHEMA):
+    """_This function is used to scrape a single school from the input file_
+
+    When the school is in the index its profile page is opened directly, the
+    search only runs on an index miss or when the indexed url is not a profile.
+    The input name, city and state are only added to the index when the search
+    match was as confident as an index lookup has to be, so an uncertain match
+    is not repeated by every later run. In delta mode a page whose hash is the PREVIOUS_HASH of the record is not parsed.
+
+    Args:
+        fetcher (_HttpFetcher | SeleniumFetcher_): _fetch backend used to load the pages_
+        inp_rec (_dict_): _normalized input record with INST_NAME, CITY, STATE and STATE_NAME_
+        index (_InstitutionIndex_, optional): _local institution index_. Defaults to None.
+        schema (_dict_, optional): _fields to extract from the profile page_. Defaults to PROFILE_SCHEMA.
+
+    Returns:
+        _tuple_: _(school_items, [(major_name, program_name), ...], page hash), school_items
+        is None when the page did not change, or None if the school was not found_
+    """
+    institute_name = inp_rec["INST_NAME"]
+    city = inp_rec["CITY"]
+    complete_state_name = inp_rec["STATE_NAME"]
+
+    response = None
+    # whether the input name, city and state can point to the profile in the index
+    confident = False
+    if index is not None:
+        with run_metrics.phase("index"):
+            entry = index.lookup(institute_name, city, complete_state_name)
+        if entry:
+            university_url = entry["url"]
+            response = load_profile(fetcher, university_url)
+            confident = True
+
+    if response is None:
+        university_url, confidence = find_university_url(
+            fetcher,
+            institute_name,
+            city,
+            inp_rec["STATE"],
+            index=index,
+            complete_state_name=complete_state_name,
+        )
+        if not university_url:
+            print("University URL not found...")
+            return None
+        confident = index is not None and confidence >= index.threshold
+
+        response = load_profile(fetcher, university_url)
+        if response is None:
+            print("School profile not visible...")
+            return None
+
+    with run_metrics.phase("hash"):
+        page_hash = content_hash(response, schema)
+    if page_hash == inp_rec.get("PREVIOUS_HASH"):
+        school_items, program_pairs = None, []
+    else:
+        school_items, program_pairs = parse_school_page(
+            response, inp_rec, schema=schema
+        )
+
+    if confident:
+        index.add(
+            institute_name,
+            city,
+            complete_state_name,
+            university_url,
+            opeid=school_items["OPEID"] if school_items else "",
+        )
+    return school_items, program_pairs, page_hash
+
+
+def load_profile(fetcher, university_url):
+    """_Loads a profile page, returns its selector or None when it is not a school profile_"""
+    with run_metrics.phase("profile", saved=LEGACY_SLEEPS["profile"]):
+        html = fetcher.profile(university_url)
+    response = Selector(text=html)
+    if not response.xpath(PROFILE_HEADER_XPATH):
+        return None
+    return response
+
+
+def parse_school_page(response, inp_rec, schema=PROFILE_SCHEMA):
+    """_This function is used to extract the school fields and its (major, program) pairs from a profile page_
+
+    Args:
+        response (_parsel.Selector_): _selector of the school profile page_
+        inp_rec (_dict_): _input record with INST_NAME, CITY and STATE_
+        schema (_dict_, optional): _fields to extract_. Defaults to PROFILE_SCHEMA.
+
+    Returns:
+        _tuple_: _(school_items, [(major_name, program_name), ...])_
+    """
+    with run_metrics.phase("fields"):
+        school_items = parse_profile(response, inp_rec, schema=schema)
+    with run_metrics.phase("programs"):
+        program_pairs = extract_program_pairs(response)
+    return school_items, program_pairs
+
+
+def extract_program_pairs(response):
+    """_This function is used to read the (major, program) pairs of the programs table of a profile page_
+
+    Walks the rows of the table once and keeps the last major row seen, instead of
+    looking back for the major of every program row.
+
+    Args:
+        response (_parsel.Selector_): _selector of the school profile page_
+
+    Returns:
+        _list_: _(major_name, program_name) tuples in page order_
+    """
+    first_major_rows = FIRST_MAJOR_ROW(response.root)
+    if not first_major_rows:
+        return []
+
+    program_pairs = []
+    major_name = None
+    for row in chain(first_major_rows[:1], first_major_rows[0].itersiblings("tr")):
+        row_class = row.get("class")
+        if row_class == "subrow nb":
+            major_name = first_text(CELL_TEXT(row))
+        elif row_class == "level1indent":
+            program_pairs.append((major_name, first_text(FIRST_CELL_TEXT(row))))
+
+    return program_pairs
+
+
+def assign_program_ids(results, registry):
+    """_This function is used to give ids to the majors and programs of a batch of scraped schools_
+
+    The pairs of the whole batch go into one frame, the distinct names are looked up
+    in the registry once and the ids are spread back with the category codes. It
+    runs on the main thread while results are merged in input order, and new names
+    get ids in the order they first appear, so the ids are the same as one school
+    at a time and do not depend on the number of workers.
+
+    Args:
+        results (_list_): _(school_items, program_pairs) tuples from scrape_school, in input order, the Program_IDs of school_items is filled in place_
+        registry (_IdRegistry_): _major and program ids_
+
+    Returns:
+        _list_: _program rows for the Program sheet, one list per school_
+    """
+    frame = pd.DataFrame(
+        [
+            (pos, major_name, program_name)
+            for pos, (_, program_pairs) in enumerate(results)
+            for major_name, program_name in program_pairs
+        ],
+        columns=["school", "Major", "Program"],
+    )
+    major_codes, major_names = pd.factorize(frame["Major"])
+    program_codes, program_names = pd.factorize(frame["Program"])
+    major_ids = np.array(registry.get_ids("major_ids", major_names), dtype=np.int64)
+    program_ids = np.array(
+        registry.get_ids("program_ids", program_names), dtype=np.int64
+    )
+
+    schools = frame["school"].to_numpy(dtype=np.int64)
+    opeids = np.array(
+        [school_items["OPEID"] for school_items, _ in results], dtype=object
+    )
+    frame.insert(0, "OPEID", opeids[schools])
+    frame.insert(1, "Major_IDs", major_ids[major_codes])
+    frame.insert(2, "Program_IDs", program_ids[program_codes])
+
+    rows = frame.drop(columns="school").to_dict("records")
+    # rows are grouped by school in input order, cut them at the school boundaries
+    bounds = np.searchsorted(schools, np.arange(len(results) + 1))
+    program_items = []
+    for pos, (school_items, _) in enumerate(results):
+        school_rows = rows[bounds[pos] : bounds[pos + 1]]
+        school_items["Program_IDs"] = ";".join(
+            str(programs["Program_IDs"]) for programs in school_rows
+        )
+        program_items.append(school_rows)
+
+    return program_items
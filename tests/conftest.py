@@ -0,0 +1,51 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture_page(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """_Serves the saved College Navigator pages the way the site answers the HttpFetcher requests_"""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        query = parse_qs(urlparse(self.path).query)
+        if "id" in query:
+            name = "profile.html"
+        elif query.get("q", [""])[0].startswith("Princeton"):
+            name = "search_2.html" if query.get("pg") == ["2"] else "search_1.html"
+        else:
+            name = "noresults.html"
+        body = fixture_page(name)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """_Local stub of College Navigator, yields the server, its url is server.base_url_"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    server.base_url = "http://127.0.0.1:{}/collegenavigator/".format(
+        server.server_address[1]
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
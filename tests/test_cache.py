@@ -0,0 +1,47 @@
+import pytest
+import cache
+from cache import PageCache
+
+
+@pytest.fixture
+def page_cache(tmp_path, monkeypatch):
+    # every put is one second after the one before, so the lru order is the put order
+    now = [1000.0]
+
+    def clock():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(cache, "time", clock)
+    page_cache = PageCache(str(tmp_path), max_bytes=250)
+    yield page_cache
+    page_cache.close()
+
+
+def blobs(tmp_path):
+    return len(list(tmp_path.glob("*.html")))
+
+
+def test_shared_blob_is_counted_once(page_cache, tmp_path):
+    for idx in range(3):
+        page_cache.put("http://x/?id={}".format(idx), "a" * 100)
+    page_cache.put("http://x/?id=3", "b" * 100)
+
+    # four pages, but only 200 bytes of blobs on disk
+    assert blobs(tmp_path) == 2
+    for idx in range(4):
+        assert page_cache.lookup("http://x/?id={}".format(idx))
+
+
+def test_evict_until_blobs_fit(page_cache, tmp_path):
+    page_cache.put("http://x/?id=0", "a" * 100)
+    page_cache.put("http://x/?id=1", "b" * 100)
+    page_cache.put("http://x/?id=2", "a" * 100)
+    page_cache.put("http://x/?id=3", "c" * 100)
+
+    # deleting id=0 frees nothing, id=2 still uses its blob, so id=1 goes too
+    assert page_cache.lookup("http://x/?id=0") is None
+    assert page_cache.lookup("http://x/?id=1") is None
+    assert page_cache.lookup("http://x/?id=2")["html"] == "a" * 100
+    assert page_cache.lookup("http://x/?id=3")["html"] == "c" * 100
+    assert blobs(tmp_path) == 2
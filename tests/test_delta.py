@@ -0,0 +1,123 @@
+import json
+import os
+from delta import DIFF_FILE, PreviousRun, write_diff
+from output import JsonlSink
+
+
+def school(name, opeid, program_ids):
+    return {
+        "School_Name": name,
+        "City": "Princeton",
+        "State": "NJ",
+        "OPEID": opeid,
+        "Total_Enrollment": "100",
+        "Program_IDs": ";".join(str(program_idx) for program_idx in program_ids),
+    }
+
+
+def program(opeid, program_idx, name):
+    return {
+        "OPEID": opeid,
+        "Major": name,
+        "Major_IDs": 1,
+        "Program": name,
+        "Program_IDs": program_idx,
+    }
+
+
+def write_store(store_dir, rows):
+    sink = JsonlSink(str(store_dir))
+    for school_items, program_items in rows:
+        sink.write(school_items, program_items)
+    sink.close()
+
+
+def read_diff(store_dir):
+    with open(os.path.join(store_dir, DIFF_FILE), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+# A and C share an OPEID, B has an empty one, like branch campuses in IPEDS
+SHARED_OPEID_ROWS = [
+    (school("A", "123", [1, 2]), [program("123", 1, "a1"), program("123", 2, "a2")]),
+    (school("B", "", [3]), [program("", 3, "b")]),
+    (school("C", "123", [4]), [program("123", 4, "c")]),
+    (school("D", "", []), []),
+]
+
+
+def test_rows_are_keyed_by_school_not_opeid(tmp_path):
+    write_store(tmp_path, SHARED_OPEID_ROWS)
+    previous = PreviousRun(str(tmp_path))
+    try:
+        for school_items, program_items in SHARED_OPEID_ROWS:
+            key = "|".join((school_items["School_Name"].lower(), "princeton", "nj"))
+            assert previous.rows(key) == (school_items, program_items)
+    finally:
+        previous.close()
+
+
+def test_orphan_programs_of_a_crashed_write_are_skipped(tmp_path):
+    write_store(tmp_path, SHARED_OPEID_ROWS[:1])
+    with open(tmp_path / "programs.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(program("123", 9, "orphan")) + "\n")
+    write_store(tmp_path, SHARED_OPEID_ROWS[2:3])
+    previous = PreviousRun(str(tmp_path))
+    try:
+        assert previous.rows("c|princeton|nj")[1] == [program("123", 4, "c")]
+    finally:
+        previous.close()
+
+
+def test_unchanged_store_has_empty_diff(tmp_path):
+    write_store(tmp_path / "old", SHARED_OPEID_ROWS)
+    previous = PreviousRun(str(tmp_path / "old"))
+    # delta mode copies the rows of unchanged schools from the earlier store
+    write_store(tmp_path / "new", [previous.rows(key) for key in previous.spans])
+    try:
+        assert write_diff(previous, str(tmp_path / "new")) == {}
+    finally:
+        previous.close()
+    old_lines = (tmp_path / "old" / "programs.jsonl").read_text().splitlines()
+    new_lines = (tmp_path / "new" / "programs.jsonl").read_text().splitlines()
+    assert new_lines == old_lines
+    assert read_diff(tmp_path / "new") == []
+
+
+def test_diff_compares_programs_per_school(tmp_path):
+    write_store(tmp_path / "old", SHARED_OPEID_ROWS)
+    changed_a = dict(SHARED_OPEID_ROWS[0][0], Total_Enrollment="200")
+    write_store(
+        tmp_path / "new",
+        [
+            (changed_a, SHARED_OPEID_ROWS[0][1]),
+            # C lost its program, a new school shares A's OPEID
+            (school("C", "123", []), []),
+            (school("E", "123", [5]), [program("123", 5, "e")]),
+        ],
+    )
+    previous = PreviousRun(str(tmp_path / "old"))
+    try:
+        counts = write_diff(previous, str(tmp_path / "new"), failed_keys=["d|princeton|nj"])
+    finally:
+        previous.close()
+
+    assert counts == {
+        ("School", "changed"): 2,
+        ("School", "new"): 1,
+        ("School", "removed"): 1,
+        ("Program", "new"): 1,
+        ("Program", "removed"): 2,
+    }
+    events = read_diff(tmp_path / "new")
+    changed = [event for event in events if event["change"] == "changed"]
+    assert changed[0]["key"] == "a|princeton|nj"
+    assert changed[0]["fields"] == {"Total_Enrollment": ["100", "200"]}
+    removed = {
+        (event["table"], event["key"]) for event in events if event["change"] == "removed"
+    }
+    assert removed == {
+        ("School", "b|princeton|nj"),
+        ("Program", "b|princeton|nj"),
+        ("Program", "c|princeton|nj"),
+    }
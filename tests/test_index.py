@@ -0,0 +1,41 @@
+import pytest
+from index import InstitutionIndex
+
+
+@pytest.fixture
+def index():
+    index = InstitutionIndex()
+    index.add("University of California", "Berkeley", "California", "?id=110635")
+    index.add(
+        "University of California-Riverside", "Riverside", "California", "?id=110671"
+    )
+    index.add("Rutgers University", "Piscataway", "New Jersey", "?id=186380")
+    index.add("Bryant & Stratton College-Amherst", "Amherst", "New York", "?id=1")
+    return index
+
+
+@pytest.mark.parametrize(
+    "name, city, state",
+    [
+        # input.csv rows of other campuses with the same name
+        ("University of California", "Los Angeles", "California"),
+        ("University of California", "Davis", "California"),
+        ("Rutgers University", "Camden", "New Jersey"),
+        ("Rutgers University", "Newark", "New Jersey"),
+        ("Bryant & Stratton College", "Buffalo", "New York"),
+    ],
+)
+def test_other_campus_is_not_returned(index, name, city, state):
+    assert index.lookup(name, city, state) is None
+
+
+def test_same_city_lookups(index):
+    assert index.lookup("University of California", "Berkeley", "California")[
+        "url"
+    ] == "?id=110635"
+    assert index.lookup("University of California", "Riverside", "California")[
+        "url"
+    ] == "?id=110671"
+    assert index.lookup("Rutgers University", "Piscataway", "NEW JERSEY")["url"] == (
+        "?id=186380"
+    )
@@ -0,0 +1,26 @@
+from bot import process_record
+from inputs import InputStream
+from journal import NOT_FOUND
+
+
+class NoNetworkPool:
+    def get(self):
+        raise AssertionError("an unknown state must not reach the network")
+
+
+def test_unknown_state_is_not_found_without_network(tmp_path):
+    input_path = tmp_path / "input.csv"
+    input_path.write_text(
+        "INST_NAME,CITY,STATE\n"
+        "Princeton University,Princeton,NJ\n"
+        "Nowhere College,Nowhere,XX\n"
+        "Princeton University,Princeton,NJ\n"
+    )
+    stream = InputStream(str(input_path))
+    rows = list(stream)
+
+    assert [row_idx for row_idx, _ in rows] == [0, 1]
+    assert stream.duplicates == 1
+    assert rows[0][1]["STATE_NAME"] == "New Jersey"
+    assert rows[1][1]["STATE_NAME"] == ""
+    assert process_record(NoNetworkPool(), None, {}, 2, rows[1]) == (NOT_FOUND, None)
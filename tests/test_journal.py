@@ -0,0 +1,46 @@
+from inputs import normalize_record
+from journal import FAILED, NOT_FOUND, SUCCESS, UNCHANGED, RunJournal
+from output import JsonlSink
+
+
+def record(name):
+    return normalize_record({"INST_NAME": name, "CITY": "Princeton", "STATE": "NJ"})
+
+
+def test_resume_skips_finished_rows(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    statuses = {"A": SUCCESS, "B": NOT_FOUND, "C": FAILED, "D": UNCHANGED}
+    for name, status in statuses.items():
+        journal.record(record(name), status)
+    # a later entry of the same key wins
+    journal.record(record("B"), FAILED)
+    journal.record(record("B"), NOT_FOUND)
+    journal.close()
+
+    journal = RunJournal(str(tmp_path))
+    resume = [
+        name for name in "ABCDE" if journal.should_process(record(name), "resume")
+    ]
+    retry = [
+        name for name in "ABCDE" if journal.should_process(record(name), "retry-failed")
+    ]
+    journal.close()
+    assert resume == ["C", "E"]
+    assert retry == ["C"]
+
+
+def test_written_school_counts_as_success_without_journal_entry(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    journal.record(record("A"), FAILED)
+    journal.close()
+    # the process died after writing the rows of A and before its journal entry
+    sink = JsonlSink(str(tmp_path))
+    sink.write(
+        {"School_Name": "A", "City": "Princeton", "State": "NJ", "OPEID": "1"}, []
+    )
+    sink.close()
+
+    journal = RunJournal(str(tmp_path))
+    assert journal.status(record("A")["KEY"]) == SUCCESS
+    assert not journal.should_process(record("A"), "resume")
+    journal.close()
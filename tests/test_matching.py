@@ -0,0 +1,113 @@
+import pytest
+from matching import MATCH_THRESHOLD, best_match, name_similarity
+
+
+def candidates(*rows):
+    return [(name, city, state, name) for name, city, state in rows]
+
+
+HARVARD_EXTENSION = ("Harvard Extension School", "Cambridge", "Massachusetts")
+HARVARD = ("Harvard University", "Cambridge", "Massachusetts")
+
+
+def test_extra_distinctive_words_are_rejected():
+    url, confidence = best_match(
+        "Harvard", "Cambridge", "Massachusetts", candidates(HARVARD_EXTENSION)
+    )
+    assert url is None
+    assert confidence < MATCH_THRESHOLD
+
+
+def test_generic_words_are_accepted():
+    url, confidence = best_match(
+        "Harvard", "Cambridge", "Massachusetts", candidates(HARVARD_EXTENSION, HARVARD)
+    )
+    assert url == "Harvard University"
+    assert confidence == pytest.approx(0.9)
+
+
+def test_wrong_city_is_rejected():
+    url, confidence = best_match(
+        "Bryant & Stratton College",
+        "Buffalo",
+        "New York",
+        candidates(("Bryant & Stratton College-Amherst", "Amherst", "New York")),
+    )
+    assert (url, confidence) == (None, 0.0)
+
+
+def test_same_name_in_another_city_is_rejected():
+    # the index used to accept it with a small penalty, it is another campus
+    rows = candidates(("Bryant & Stratton College", "Amherst", "New York"))
+    assert best_match("Bryant & Stratton College", "Buffalo", "New York", rows, 0.85) == (
+        None,
+        0.0,
+    )
+
+
+def test_wrong_state_is_rejected():
+    rows = candidates(("Harvard University", "Cambridge", "Ohio"))
+    assert best_match("Harvard University", "Cambridge", "Massachusetts", rows) == (
+        None,
+        0.0,
+    )
+
+
+@pytest.mark.parametrize(
+    "name, city, other_name",
+    [
+        ("University of Michigan", "Ann Arbor", "University of Michigan-Ann Arbor"),
+        ("Rutgers University", "New Brunswick", "Rutgers University-New Brunswick"),
+        ("University of Texas", "Austin", "The University of Texas at Austin"),
+        ("St. John's University", "Queens", "Saint Johns University"),
+    ],
+)
+def test_campus_and_spelling_variants_match(name, city, other_name):
+    assert name_similarity(name, other_name, city) == 0.99
+
+
+@pytest.mark.parametrize(
+    "name, other_name",
+    [
+        ("Boston College", "Boston University"),
+        ("Princeton University", "Princeton Theological Seminary"),
+        ("University of Michigan", "University of Michigan-Dearborn"),
+    ],
+)
+def test_other_schools_do_not_match(name, other_name):
+    assert name_similarity(name, other_name) < MATCH_THRESHOLD
+
+
+def test_identical_names():
+    assert name_similarity("Princeton University", "princeton university") == 1.0
+
+
+@pytest.mark.parametrize(
+    "name, city, state, other_name",
+    [
+        # input.csv rows whose NCES name is the input name and a campus
+        ("University of Cincinnati", "Cincinnati", "Ohio", "University of Cincinnati-Main Campus"),
+        ("Oklahoma State University", "Stillwater", "Oklahoma", "Oklahoma State University-Main Campus"),
+        ("University of California", "La Jolla", "California", "University of California-San Diego"),
+        ("The University of Texas", "Richardson", "Texas", "The University of Texas at Dallas"),
+        ("California State University", "Hayward", "California", "California State University-East Bay"),
+    ],
+)
+def test_campus_of_input_name_matches(name, city, state, other_name):
+    url, confidence = best_match(name, city, state, candidates((other_name, city, state)))
+    assert url == other_name
+    assert confidence >= MATCH_THRESHOLD
+    # another campus of the same system in another city is not taken
+    assert best_match(name, "Elsewhere", state, candidates((other_name, city, state))) == (
+        None,
+        0.0,
+    )
+
+
+def test_best_campus_wins():
+    rows = candidates(
+        ("University of California-Berkeley Extension", "Berkeley", "California"),
+        ("University of California-Berkeley", "Berkeley", "California"),
+    )
+    url, _ = best_match("University of California", "Berkeley", "California", rows)
+    assert url == "University of California-Berkeley"
@@ -0,0 +1,58 @@
+from output import JsonlSink, school_frame
+
+
+def school(name, **fields):
+    return {
+        "OPEID": "00262700",
+        "School_Name": name,
+        "City": "Princeton",
+        "State": "NJ",
+        "Program_IDs": "1;2",
+        **fields,
+    }
+
+
+def frame_of(tmp_path, rows):
+    sink = JsonlSink(str(tmp_path))
+    for school_items in rows:
+        sink.write(school_items, [])
+    sink.close()
+    return school_frame(str(tmp_path))
+
+
+def test_count_columns_are_always_integers(tmp_path):
+    # "-" is the not applicable marker, a store may hold nothing else in a column
+    frame = frame_of(
+        tmp_path,
+        [
+            school(
+                "A",
+                Total_Enrollment="5,432",
+                Arrests_a="-",
+                Housing_Arrests_b_2022="-",
+                Applicants_Total="",
+            ),
+            school("B", Total_Enrollment="-", Arrests_a="-", Housing_Arrests_b_2022="3"),
+        ],
+    )
+    for column in (
+        "Total_Enrollment",
+        "Arrests_a",
+        "Housing_Arrests_b_2022",
+        "Applicants_Total",
+    ):
+        assert str(frame[column].dtype) == "Int64", column
+    assert frame["Total_Enrollment"].tolist()[0] == 5432
+    assert frame["Arrests_a"].isna().all()
+    assert frame["Housing_Arrests_b_2022"].tolist()[1] == 3
+
+
+def test_other_columns_stay_text(tmp_path):
+    frame = frame_of(
+        tmp_path,
+        [school("A", Retention_Full_Time_Rate="98%", **{"Student Population": "12"})],
+    )
+    assert frame["OPEID"].tolist() == ["00262700"]
+    assert str(frame["Student Population"].dtype) == "string"
+    assert str(frame["Retention_Full_Time_Rate"].dtype) == "string"
+    assert frame["Program_IDs"].tolist() == [[1, 2]]
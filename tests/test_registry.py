@@ -0,0 +1,70 @@
+import json
+from registry import IdRegistry
+
+
+def write_ids(filepath, major_ids, program_ids):
+    with open(filepath, "w") as f:
+        json.dump({"major_ids": major_ids, "program_ids": program_ids}, f)
+
+
+def test_new_ids_continue_after_the_highest_id(tmp_path):
+    filepath = str(tmp_path / "ids.json")
+    write_ids(filepath, {"Biology": 1, "History": 7}, {})
+    registry = IdRegistry(filepath)
+
+    assert registry.major_id("History") == 7
+    assert registry.get_ids("major_ids", ["Physics", "Biology", "Art"]) == [8, 1, 9]
+    assert registry.program_id("Biology, General") == 1
+
+
+def test_flush_writes_only_new_ids(tmp_path):
+    filepath = str(tmp_path / "ids.json")
+    write_ids(filepath, {"Biology": 1}, {"Biology, General": 1})
+    registry = IdRegistry(filepath)
+    registry.major_id("Biology")
+    registry.flush()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    registry.major_id("Physics")
+    registry.flush()
+    with open(filepath) as f:
+        assert json.load(f)["major_ids"] == {"Biology": 1, "Physics": 2}
+    assert IdRegistry(filepath).major_id("Chemistry") == 3
+
+
+def test_flush_interval(tmp_path):
+    filepath = str(tmp_path / "ids.json")
+    registry = IdRegistry(filepath, flush_interval=3600)
+    registry.major_id("Biology")
+    registry.flush()
+    assert not (tmp_path / "ids.json").exists()
+
+    registry.flush(force=True)
+    with open(filepath) as f:
+        assert json.load(f) == {"major_ids": {"Biology": 1}, "program_ids": {}}
+
+
+def test_ids_survive_a_crash_between_rewrites(tmp_path):
+    filepath = str(tmp_path / "ids.json")
+    registry = IdRegistry(filepath, flush_interval=3600)
+    registry.major_id("Biology")
+    registry.flush(force=True)
+    registry.get_ids("major_ids", ["Physics", "Art"])
+    # rows using these ids are written after this flush, then the process dies
+    registry.flush()
+    with open(filepath + ".log", "a") as f:
+        f.write('["major_ids", "Che')
+
+    registry = IdRegistry(filepath, flush_interval=3600)
+    assert not (tmp_path / "ids.json.log").exists()
+    assert registry.get_ids("major_ids", ["Biology", "Physics", "Art"]) == [1, 2, 3]
+    assert registry.major_id("Chemistry") == 4
+    registry.flush()
+    registry = IdRegistry(filepath)
+    with open(filepath) as f:
+        assert json.load(f)["major_ids"] == {
+            "Biology": 1,
+            "Physics": 2,
+            "Art": 3,
+            "Chemistry": 4,
+        }
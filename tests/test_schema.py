@@ -0,0 +1,54 @@
+import os
+from parsel import Selector
+from schema import PROFILE_SCHEMA, SECTIONS, build_schema, extract_fields
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def profile_page():
+    with open(os.path.join(FIXTURES_DIR, "profile.html"), encoding="utf-8") as f:
+        return Selector(text=f.read())
+
+
+def test_profile_schema_columns():
+    fields = extract_fields(profile_page())
+    assert list(fields) == list(PROFILE_SCHEMA)
+    assert fields["OPEID"] == "00262700"
+    assert fields["Student Population"] == "8,842 (5,527 undergraduate)"
+    assert fields["Criminal_Offenses_k"] == "12"
+    assert fields["VAWA_Offenses_a"] == "22"
+
+
+def test_crime_sections():
+    fields = extract_fields(profile_page(), build_schema(["crime_years", "crime_other"]))
+    assert fields["Criminal_Offenses_a_2020"] == "0"
+    assert fields["Criminal_Offenses_a_2022"] == "2"
+    assert fields["Housing_Arrests_c_2021"] == "133"
+    assert fields["Noncampus_Disciplinary_Actions_a"] == "242"
+    # the page has no Public Property table
+    assert fields["Public_Arrests_a"] == ""
+    assert not any(column.startswith("Public_Arrests_a_") for column in fields)
+
+
+def test_tuition_admissions_retention_labels():
+    fields = extract_fields(
+        profile_page(), build_schema(["tuition", "admissions", "retention"])
+    )
+    assert fields["In_State_Tuition_2023_2024"] == "$57,410"
+    assert fields["Out_Of_State_Fees_2021_2022"] == "-"
+    assert fields["Books_And_Supplies_2023_2024"] == "$1,100"
+    assert fields["Applicants_Total"] == "38,019"
+    # "Percent admitted" is not confused with "Percent admitted who enrolled"
+    assert fields["Percent_Admitted_Women"] == "4%"
+    assert fields["Percent_Admitted_Enrolled_Total"] == "78%"
+    assert fields["Retention_Full_Time_Rate"] == "98%"
+    assert fields["Retention_Part_Time_Rate"] == "-"
+
+
+def test_every_section_label_is_on_the_profile():
+    fields = extract_fields(profile_page(), build_schema(SECTIONS))
+    for section in ("tuition", "admissions", "retention"):
+        for name in SECTIONS[section]:
+            prefix = name.format("")
+            assert any(column.startswith(prefix) for column in fields), name
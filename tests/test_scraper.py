@@ -0,0 +1,126 @@
+from unittest.mock import patch
+from parsel import Selector
+from cache import PageCache
+from fetchers import LEGACY_SLEEPS, PROFILE_HEADER_XPATH, HttpFetcher
+from index import InstitutionIndex
+from inputs import normalize_record
+from metrics import RunMetrics
+from scraper import find_university_url, scrape_school
+
+
+PRINCETON = {"INST_NAME": "Princeton University", "CITY": "Princeton", "STATE": "NJ"}
+
+
+def test_search_and_relative_next_page(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    first_page = Selector(text=fetcher.search("Princeton University", "NJ", "New Jersey"))
+    assert first_page.xpath("//strong/text()").get() == "Princeton Theological Seminary"
+
+    second_page = Selector(text=fetcher.next_page(first_page))
+    assert second_page.xpath("//strong/text()").get() == "Princeton University"
+    assert fetcher.next_page(second_page) is None
+    # the relative href of the next page link is resolved against base_url
+    assert stub_server.requests[1] == "/collegenavigator/?q=Princeton+University&s=NJ&pg=2"
+    fetcher.close()
+
+
+def test_profile(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    response = Selector(text=fetcher.profile("?q=Princeton+University&s=NJ&id=186131"))
+    assert response.xpath(PROFILE_HEADER_XPATH + "/text()").get() == "Princeton University"
+    assert stub_server.requests == ["/collegenavigator/?q=Princeton+University&s=NJ&id=186131"]
+    fetcher.close()
+
+
+def test_scrape_school(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    school_items, program_pairs, page_hash = scrape_school(
+        fetcher, normalize_record(PRINCETON)
+    )
+    fetcher.close()
+
+    # the seminary on the first page is not taken for the university
+    assert stub_server.requests[-1].endswith("id=186131")
+    assert school_items["OPEID"] == "00262700"
+    assert school_items["School_Name"] == "Princeton University"
+    assert school_items["Total_Enrollment"] == "8,842"
+    assert school_items["Criminal_Offenses_a"] == "2"
+    assert school_items["Disciplinary_Actions_c"] == "44"
+    assert program_pairs[:3] == [
+        ("Major 0", "Program 0-0"),
+        ("Major 0", "Program 0-1"),
+        ("Major 1", "Program 1-0"),
+    ]
+    assert len(program_pairs) == 6
+    assert len(page_hash) == 64
+
+
+def test_scrape_school_unchanged_page_is_not_parsed(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    inp_rec = normalize_record(PRINCETON)
+    page_hash = scrape_school(fetcher, inp_rec)[2]
+    inp_rec["PREVIOUS_HASH"] = page_hash
+    assert scrape_school(fetcher, inp_rec) == (None, [], page_hash)
+    fetcher.close()
+
+
+def test_scrape_school_no_results(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    inp_rec = normalize_record({"INST_NAME": "Nowhere College", "CITY": "X", "STATE": "DC"})
+    assert scrape_school(fetcher, inp_rec) is None
+    assert len(stub_server.requests) == 1
+    fetcher.close()
+
+
+def test_last_page_is_not_counted_as_a_page(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    metrics = RunMetrics()
+    metrics.begin_record(0)
+    with patch("scraper.run_metrics", metrics), patch("fetchers.run_metrics", metrics):
+        find_university_url(fetcher, "Princeton Seminary", "Princeton", "NJ")
+    fetcher.close()
+
+    # search page 1, then page 2 which has no next page link
+    assert len(stub_server.requests) == 2
+    assert metrics.stages["paginate"].count == 1
+    assert metrics.saved["paginate"] == LEGACY_SLEEPS["next_page"]
+    assert metrics.local.school["pages"] == 2
+
+
+def test_cached_pages_are_not_counted(stub_server, tmp_path):
+    page_cache = PageCache(str(tmp_path))
+    fetcher = HttpFetcher(base_url=stub_server.base_url, cache=page_cache)
+    metrics = RunMetrics()
+    with patch("scraper.run_metrics", metrics), patch("fetchers.run_metrics", metrics):
+        for _ in range(2):
+            metrics.begin_record(0)
+            scrape_school(fetcher, normalize_record(PRINCETON))
+            metrics.end_record("success", 1)
+    fetcher.close()
+    page_cache.close()
+
+    # search, next page and profile are downloaded once, the second time they come from the cache
+    assert len(stub_server.requests) == 3
+    assert metrics.pages.sum == 3
+    assert metrics.pages.count == 2
+
+
+def test_only_confident_matches_are_indexed(stub_server):
+    fetcher = HttpFetcher(base_url=stub_server.base_url)
+    index = InstitutionIndex()
+    seminary = normalize_record(
+        {"INST_NAME": "Princeton Seminary", "CITY": "Princeton", "STATE": "NJ"}
+    )
+    assert scrape_school(fetcher, seminary, index=index)[0]["OPEID"] == "00262700"
+    assert scrape_school(fetcher, normalize_record(PRINCETON), index=index)
+    fetcher.close()
+
+    # the rows of the results pages are indexed under their own names
+    assert index.lookup("Princeton Theological Seminary", "Princeton", "New Jersey")
+    assert index.make_key("Princeton Seminary", "Princeton", "New Jersey") not in (
+        index.entries
+    )
+    entry = index.entries[
+        index.make_key("Princeton University", "Princeton", "New Jersey")
+    ]
+    assert entry["opeid"] == "00262700"
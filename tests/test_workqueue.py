@@ -0,0 +1,59 @@
+import pytest
+import workqueue
+from workqueue import DONE, LEASED, PENDING, WorkQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(workqueue, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60)
+    queue.enqueue([(pos, {"INST_NAME": "School {}".format(pos)}) for pos in range(3)])
+    yield queue
+    queue.close()
+
+
+def test_lease_hands_out_pending_rows_once(queue, clock):
+    assert [pos for pos, _ in queue.lease("a", 2)] == [0, 1]
+    assert queue.lease("b", 2) == [[2, {"INST_NAME": "School 2"}]]
+    assert queue.lease("b", 2) == []
+    assert queue.counts() == {PENDING: 0, LEASED: 3, DONE: 0}
+
+
+def test_enqueue_keeps_existing_rows(queue, clock):
+    queue.lease("a", 1)
+    queue.enqueue([(0, {"INST_NAME": "again"}), (3, {"INST_NAME": "School 3"})])
+    assert queue.counts() == {PENDING: 3, LEASED: 1, DONE: 0}
+
+
+def test_expired_lease_goes_back_to_pending(queue, clock):
+    queue.lease("crashed", 3)
+    clock[0] += 59
+    assert queue.lease("b", 3) == []
+    clock[0] += 2
+    assert [pos for pos, _ in queue.lease("b", 3)] == [0, 1, 2]
+
+
+def test_late_result_of_expired_lease_is_ignored(queue, clock):
+    queue.lease("slow", 1)
+    clock[0] += 61
+    queue.lease("b", 1)
+    queue.complete(0, "from b")
+    queue.complete(0, "from slow")
+    assert queue.ready_results() == [(0, {"INST_NAME": "School 0"}, "from b")]
+
+
+def test_results_are_merged_in_input_order(queue, clock):
+    queue.lease("a", 3)
+    queue.complete(1, "one")
+    assert queue.ready_results() == []
+    queue.complete(0, "zero")
+    assert [pos for pos, _, _ in queue.ready_results()] == [0, 1]
+    queue.mark_merged(0)
+    queue.mark_merged(1)
+    assert queue.unmerged() == 1
@@ -0,0 +1,257 @@
+import json
+import os
+import socket
+import sqlite3
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep, time
+import requests
+from helpers import backoff_delay
+
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+
+def worker_name():
+    return "{}-{}".format(socket.gethostname(), os.getpid())
+
+
+class WorkQueue:
+    """_Queue of input rows in an sqlite file, workers lease rows and push their results back_
+
+    A leased row that is not completed before its lease runs out goes back to
+    pending, so rows of a crashed worker are picked up by another one. Only the
+    first result of a row is kept. Several processes on one machine (or on a
+    shared disk) can use the file directly, other machines go through serve_queue.
+
+    Args:
+        db_path (_str_): _sqlite file of the queue, created if missing_
+        lease_seconds (float, optional): _time a worker has to complete a leased row_. Defaults to 300.
+    """
+
+    def __init__(self, db_path, lease_seconds=300):
+        self.lease_seconds = lease_seconds
+        self.lock = Lock()
+        self.db = sqlite3.connect(
+            db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS tasks (
+                pos INTEGER PRIMARY KEY,
+                record TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                leases INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                merged INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+
+    def enqueue(self, indexed_records):
+        """_Adds (position, input record) pairs, rows already in the queue are kept as they are_"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany(
+                "INSERT OR IGNORE INTO tasks (pos, record) VALUES (?, ?)",
+                [
+                    (pos, json.dumps(inp_rec, ensure_ascii=False))
+                    for pos, inp_rec in indexed_records
+                ],
+            )
+            self.db.execute("COMMIT")
+
+    def lease(self, worker, count):
+        """_Leases up to count pending rows to worker, oldest first_
+
+        Returns:
+            _list_: _[position, input record] pairs_
+        """
+        now = time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute(
+                "UPDATE tasks SET state = ? WHERE state = ? AND lease_until < ?",
+                (PENDING, LEASED, now),
+            )
+            rows = self.db.execute(
+                "SELECT pos, record FROM tasks WHERE state = ? ORDER BY pos LIMIT ?",
+                (PENDING, count),
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE tasks SET state = ?, worker = ?, lease_until = ?, leases = leases + 1 WHERE pos = ?",
+                [(LEASED, worker, now + self.lease_seconds, pos) for pos, _ in rows],
+            )
+            self.db.execute("COMMIT")
+        return [[pos, json.loads(record)] for pos, record in rows]
+
+    def complete(self, pos, result):
+        """_Stores the result of a row, a late result of an expired lease is ignored if another one came first_"""
+        with self.lock:
+            self.db.execute(
+                "UPDATE tasks SET state = ?, result = ? WHERE pos = ? AND state != ?",
+                (DONE, json.dumps(result, ensure_ascii=False), pos, DONE),
+            )
+
+    def counts(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT state, COUNT(*) FROM tasks GROUP BY state"
+            ).fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def ready_results(self):
+        """_Returns the results that can be merged now: the done rows before the first row that is not done_
+
+        Returns:
+            _list_: _(position, input record, result) tuples in input order_
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT pos, record, state, result FROM tasks WHERE merged = 0 ORDER BY pos"
+            ).fetchall()
+        ready = []
+        for pos, record, state, result in rows:
+            if state != DONE:
+                break
+            ready.append((pos, json.loads(record), json.loads(result)))
+        return ready
+
+    def mark_merged(self, pos):
+        with self.lock:
+            self.db.execute("UPDATE tasks SET merged = 1 WHERE pos = ?", (pos,))
+
+    def unmerged(self):
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM tasks WHERE merged = 0"
+            ).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def serve_queue(queue, host, port):
+    """_This function is used to expose a WorkQueue to workers on other machines over http_
+
+    Args:
+        queue (_WorkQueue_): _queue to serve_
+        host (_str_): _address to listen on, e.g. "0.0.0.0"_
+        port (_int_): _port to listen on_
+
+    Returns:
+        _ThreadingHTTPServer_: _the running server, stop it with shutdown()_
+    """
+
+    class QueueHandler(BaseHTTPRequestHandler):
+        def reply(self, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/counts":
+                self.reply(queue.counts())
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/lease":
+                self.reply(queue.lease(payload["worker"], payload["count"]))
+            elif self.path == "/complete":
+                queue.complete(payload["pos"], payload["result"])
+                self.reply({})
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), QueueHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class RemoteQueue:
+    """_Client of a queue served by serve_queue, with the methods workers use from WorkQueue_
+
+    Args:
+        url (_str_): _address of the coordinator, e.g. "http://10.0.0.5:8600"_
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def call(self, method, path, payload=None):
+        response = self.session.request(
+            method, self.url + path, json=payload, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def lease(self, worker, count):
+        return self.call("POST", "/lease", {"worker": worker, "count": count})
+
+    def complete(self, pos, result):
+        self.call("POST", "/complete", {"pos": pos, "result": result})
+
+    def counts(self):
+        return self.call("GET", "/counts")
+
+    def close(self):
+        self.session.close()
+
+
+def open_queue(location, lease_seconds=300):
+    """_This function is used to open a queue from an http url or an sqlite file path_"""
+    if location.startswith(("http://", "https://")):
+        return RemoteQueue(location)
+    return WorkQueue(location, lease_seconds=lease_seconds)
+
+
+def run_worker(queue, process, pool_map, batch_size, poll_seconds=5):
+    """_This function is used to lease rows, scrape them and push the results back until the queue is empty_
+
+    Args:
+        queue (_WorkQueue | RemoteQueue_): _queue to work on_
+        process (_callable_): _function called with (position, input record), returns a json friendly result_
+        pool_map (_callable_): _map function running process over a list of tasks, e.g. imap_ordered_
+        batch_size (_int_): _number of rows leased at a time_
+        poll_seconds (float, optional): _wait time when all rows are leased by other workers_. Defaults to 5.
+    """
+    worker = worker_name()
+    failures = 0
+    while True:
+        try:
+            tasks = queue.lease(worker, batch_size)
+            counts = None if tasks else queue.counts()
+            failures = 0
+        except requests.RequestException as e:
+            # the coordinator shuts down once every row is merged
+            failures += 1
+            if failures >= 5:
+                print("Coordinator not reachable, stopping -> {!r}".format(e))
+                return
+            sleep(backoff_delay(failures))
+            continue
+        if not tasks:
+            if not counts[PENDING] and not counts[LEASED]:
+                return
+            # rows leased by a crashed worker come back once their lease runs out
+            sleep(poll_seconds)
+            continue
+        for (pos, _), result in pool_map(process, [tuple(task) for task in tasks]):
+            queue.complete(pos, result)